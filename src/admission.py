@@ -0,0 +1,136 @@
+"""Admission control and load shedding for the GenAI stage.
+
+Caps how many negotiations may be inside the GenAI stage at once. Extra
+requests wait in a bounded FIFO for at most `max_wait_seconds`; once the wait
+queue is full (or the wait expires) they are rejected immediately with
+`AdmissionRejected`, which the API turns into a fast 503 + Retry-After instead
+of letting a burst run into provider rate limits and slow failures.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"GenAI stage overloaded ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 32, max_waiting: int = 64, max_wait_seconds: float = 2.0,
+                 sample_size: int = 512, on_wait=None):
+        """`on_wait(seconds)` is called with the queueing delay of every admitted request."""
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self._waiters = deque()
+        self._wait_samples = deque(maxlen=sample_size)
+        self._service_samples = deque(maxlen=sample_size)
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_wait_observed = 0.0
+        self.on_wait = on_wait
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, timeout: float | None = None):
+        """Holds one GenAI slot for the duration of the block."""
+        await self.acquire(timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._service_samples.append(time.perf_counter() - started)
+            self.release()
+
+    async def acquire(self, timeout: float | None = None):
+        """Waits for a slot; `timeout` (e.g. the request's remaining budget) can only shorten max_wait_seconds."""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._record_admission(0.0)
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        max_wait = self.max_wait_seconds if timeout is None else min(timeout, self.max_wait_seconds)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=max(max_wait, 0.0))
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected_timeout += 1
+            raise AdmissionRejected("wait_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        # The releasing request handed its slot straight to us, so in_flight is unchanged.
+        self._record_admission(time.perf_counter() - started)
+
+    def try_acquire(self) -> bool:
+        """Takes a free slot without waiting, for optional work such as hedged calls; release() it afterwards.
+
+        Returns False if every slot is taken or requests are already waiting for one.
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self.release()  # A slot was handed over just as we gave up: pass it on
+            return
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record_admission(self, waited: float):
+        self.admitted += 1
+        self._wait_samples.append(waited)
+        self.max_wait_observed = max(self.max_wait_observed, waited)
+        if self.on_wait is not None:
+            self.on_wait(waited)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain (at least 1)."""
+        if not self._service_samples:
+            return 1
+        mean_service = sum(self._service_samples) / len(self._service_samples)
+        return max(1, math.ceil(mean_service * (len(self._waiters) + 1) / self.max_in_flight))
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_samples)
+        return {
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_waiting,
+            "max_wait_seconds": self.max_wait_seconds,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_seconds_p50": round(waits[len(waits) // 2], 4) if waits else 0.0,
+            "wait_seconds_p95": round(waits[int(len(waits) * 0.95)], 4) if waits else 0.0,
+            "wait_seconds_max": round(self.max_wait_observed, 4),
+        }
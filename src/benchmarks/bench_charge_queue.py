@@ -0,0 +1,76 @@
+"""Benchmark: ChargeQueue vs. the original list-based CHARGE_REQUEST_QUEUE.
+
+Measures the two hot-path operations at 10k and 100k queued sessions:
+  * upsert  - a queued driver re-negotiates (drop old entry, append new one)
+  * ordered - the priority-ordered view built for every /api/status poll
+
+Run from the `src` directory:  python3 benchmarks/bench_charge_queue.py
+"""
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+
+PRIORITIES = ["high", "medium", "low"]
+PRIORITY_MAP = {"high": 3, "medium": 2, "low": 1}
+
+
+def make_request(i: int):
+    return SimpleNamespace(user_did=f"did:denso:user:bench:{i}", priority=random.choice(PRIORITIES))
+
+
+# --- Original implementation (orchestrator.py before the indexed queue) ---
+def list_upsert(queue: list, request) -> list:
+    queue = [r for r in queue if r.user_did != request.user_did]
+    queue.append(request)
+    return queue
+
+
+def list_ordered(queue: list) -> list:
+    return sorted(queue, key=lambda r: PRIORITY_MAP.get(r.priority, 0), reverse=True)
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean seconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(size: int, upserts: int, polls: int):
+    requests = [make_request(i) for i in range(size)]
+    updates = [make_request(random.randrange(size)) for _ in range(upserts)]
+
+    legacy = list(requests)
+    indexed = ChargeQueue()
+    for r in requests:
+        indexed.upsert(r)
+
+    state = {"legacy": legacy}
+    it_legacy, it_indexed = iter(updates), iter(updates)
+
+    def legacy_upsert():
+        state["legacy"] = list_upsert(state["legacy"], next(it_legacy))
+
+    legacy_up = timed(legacy_upsert, upserts)
+    indexed_up = timed(lambda: indexed.upsert(next(it_indexed)), upserts)
+    legacy_poll = timed(lambda: list_ordered(state["legacy"]), polls)
+    indexed_poll = timed(lambda: list(indexed), polls)
+
+    assert [r.user_did for r in list_ordered(state["legacy"])] == [r.user_did for r in indexed]
+
+    print(f"\n--- {size:,} queued sessions ---")
+    print(f"upsert   list: {legacy_up * 1e6:10.1f} us   ChargeQueue: {indexed_up * 1e6:8.2f} us   ({legacy_up / indexed_up:,.0f}x)")
+    print(f"ordered  list: {legacy_poll * 1e3:10.2f} ms   ChargeQueue: {indexed_poll * 1e3:8.2f} ms   ({legacy_poll / indexed_poll:,.1f}x)")
+
+
+if __name__ == "__main__":
+    random.seed(42)
+    run(10_000, upserts=500, polls=50)
+    run(100_000, upserts=100, polls=10)
@@ -0,0 +1,79 @@
+"""Benchmark: re-estimating the whole queue's charge times in one NumPy call.
+
+Compares `ChargeTimeModel.minutes` over every session with a per-session
+Python integration of the same taper curve in 0.1% SoC steps. It checks that
+both agree, and also times a full `PowerAllocator.pickup_changes` pass, which
+is what the orchestrator runs after every power step.
+
+Run from the `src` directory:  python3 benchmarks/bench_charge_time.py
+"""
+import bisect
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_time import TAPER_CURVE, ChargeTimeModel
+from power_allocation import PowerAllocator
+
+BATTERY_KWH = 60.0
+CHARGER_KW = [11.0, 22.0, 50.0, 150.0]
+
+
+def python_minutes(curve: list, model: ChargeTimeModel, start_soc: float, target_soc: float, power_kw: float) -> float:
+    minutes, soc, step = 0.0, start_soc, 0.1
+    socs = [point[0] for point in curve]
+    while soc < target_soc - 1e-9:
+        width = min(step, target_soc - soc)
+        mid = soc + width / 2
+        k = min(bisect.bisect_right(socs, mid), len(curve) - 1)
+        (s0, t0), (s1, t1) = curve[k - 1], curve[k]
+        taper = t0 + (t1 - t0) * (mid - s0) / (s1 - s0)
+        minutes += BATTERY_KWH / 100 * width / min(power_kw, model.vehicle_max_kw * taper) / model.efficiency * 60
+        soc += width
+    return minutes
+
+
+def run(size: int, repeat: int = 20):
+    model = ChargeTimeModel()
+    start = np.array([random.uniform(3, 70) for _ in range(size)])
+    target = np.array([random.choice([80, 90, 100]) for _ in range(size)], dtype=float)
+    power = np.array([random.choice(CHARGER_KW) * random.uniform(0.3, 1.0) for _ in range(size)])
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        vectorized = model.minutes(start, target, power, BATTERY_KWH)
+    numpy_ms = (time.perf_counter() - started) / repeat * 1e3
+
+    sample = range(0, size, max(size // 200, 1))
+    started = time.perf_counter()
+    expected = [python_minutes(list(TAPER_CURVE), model, float(start[i]), float(target[i]), float(power[i])) for i in sample]
+    loop_ms = (time.perf_counter() - started) / len(sample) * size * 1e3
+    error = max(abs(vectorized[i] - e) for i, e in zip(sample, expected))
+
+    allocator = PowerAllocator(BATTERY_KWH, capacity=size, charge_model=model)
+    now = time.time()
+    for i in range(size):
+        allocator.upsert(f"did:bench:{i}", "medium", np.inf, (target[i] - start[i]) / 100 * BATTERY_KWH, target[i])
+    allocator.set_plan([(f"did:bench:{i}", 0.0 if i < 200 else i / 10, random.choice(CHARGER_KW), i % 200)
+                        for i in range(size)], now)
+    allocator.step(2000.0, now)
+    started = time.perf_counter()
+    allocator.pickup_changes(now, 0.6)
+    first_ms = (time.perf_counter() - started) * 1e3
+    allocator.step(2000.0, now + 1, 1.0)
+    started = time.perf_counter()
+    moved = allocator.pickup_changes(now + 1, 0.6)
+    steady_ms = (time.perf_counter() - started) * 1e3
+    print(f"{size:>7,} sessions | numpy {numpy_ms:6.2f} ms | python ~{loop_ms:9.1f} ms | max diff {error:.3f} min"
+          f" | pickup pass: first {first_ms:6.2f} ms, next {steady_ms:5.2f} ms ({len(moved)} moved)")
+
+
+if __name__ == "__main__":
+    random.seed(11)
+    for size in (1_000, 10_000, 100_000):
+        run(size)
@@ -0,0 +1,92 @@
+"""Benchmark: SQLite WAL persistence (persistence.DurableStore) at 100k rows.
+
+  * writes   - upserts/s through the group-committing writer thread, measured
+               until everything is committed, vs. one commit per request
+  * recovery - time to read 100k queued requests back and rebuild ChargeQueue
+
+Run from the `src` directory:  python3 benchmarks/bench_persistence.py [--rows 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+from persistence import DurableStore, connect, load_state
+
+PRIORITIES = ["high", "medium", "low"]
+
+
+def make_payload(i: int) -> tuple[str, str]:
+    user_did = f"did:denso:user:bench:{i}"
+    return user_did, json.dumps({
+        "user_did": user_did, "priority": random.choice(PRIORITIES), "leave_by": None, "min_soc": 80,
+        "start_soc": random.randint(5, 90), "original_text": "I need a charge before my meeting at 5pm.",
+        "received_at": time.time(), "charging_option": "fast_charge", "points_awarded": 10,
+        "pickup_time": "17:45", "is_grid_stressed_at_request": False,
+    })
+
+
+def bench_group_commit(path: str, rows: list, synchronous: str) -> tuple[float, dict]:
+    store = DurableStore(path, synchronous=synchronous)
+    started = time.perf_counter()
+    for user_did, payload in rows:
+        store.upsert_request(user_did, payload)
+    store.flush()
+    elapsed = time.perf_counter() - started
+    stats = store.stats()
+    store.close()
+    return elapsed, stats
+
+
+def bench_commit_per_request(path: str, rows: list, synchronous: str) -> float:
+    conn = connect(path, synchronous)
+    started = time.perf_counter()
+    for user_did, payload in rows:
+        conn.execute("BEGIN")
+        conn.execute("INSERT OR REPLACE INTO charge_requests (user_did, payload) VALUES (?, ?)", (user_did, payload))
+        conn.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return elapsed
+
+
+def bench_recovery(path: str) -> tuple[float, float, int]:
+    started = time.perf_counter()
+    requests, _, _ = load_state(path)
+    loaded = time.perf_counter()
+    queue = ChargeQueue()
+    for fields in requests:
+        queue.upsert(SimpleNamespace(**fields))
+    return loaded - started, time.perf_counter() - loaded, len(queue)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--baseline-rows", type=int, default=5_000, help="rows for the commit-per-request baseline")
+    args = parser.parse_args()
+    rows = [make_payload(i) for i in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for synchronous in ("NORMAL", "FULL"):
+            path = os.path.join(tmp, f"group-{synchronous}.db")
+            elapsed, stats = bench_group_commit(path, rows, synchronous)
+            print(f"group commit    synchronous={synchronous:6s} {args.rows / elapsed:10,.0f} writes/s  "
+                  f"({stats['commits']} commits, {stats['writes_per_commit']} writes/commit)")
+            baseline_rows = rows[:args.baseline_rows]
+            elapsed = bench_commit_per_request(os.path.join(tmp, f"single-{synchronous}.db"), baseline_rows, synchronous)
+            print(f"commit/request  synchronous={synchronous:6s} {len(baseline_rows) / elapsed:10,.0f} writes/s")
+
+        read_seconds, rebuild_seconds, size = bench_recovery(os.path.join(tmp, "group-NORMAL.db"))
+        print(f"recovery: {size:,} queued requests - read+decode {read_seconds * 1000:.0f} ms, "
+              f"rebuild {rebuild_seconds * 1000:.0f} ms, total {(read_seconds + rebuild_seconds) * 1000:.0f} ms")
+        assert sqlite3.connect(os.path.join(tmp, "group-NORMAL.db")).execute(
+            "SELECT COUNT(*) FROM charge_requests").fetchone()[0] == args.rows
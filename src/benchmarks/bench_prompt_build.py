@@ -0,0 +1,98 @@
+"""Microbenchmark: per-call prompt/config build cost before and after prompts.py.
+
+"before" reproduces what get_intent_from_genai did on every call: build the
+memory string, the multi-paragraph system prompt f-string and a fresh
+GenerateContentConfig with a nested Schema. "after" renders the precompiled
+template and reuses the shared config. The "after" prompt has since shrunk to
+intent extraction only (the plan rules moved to charging_plan.py), so the two
+prompts are compared by size rather than by content.
+
+Run from the `src` directory:  python3 benchmarks/bench_prompt_build.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google.genai.types import GenerateContentConfig, Schema, Type
+
+from prompts import INTENT_REQUIRED_KEYS, SINGLE_INTENT_CONFIG, SINGLE_INTENT_PROMPT, build_intent_prompt, render_memory_line
+
+RECENT = [
+    {"priority": "high", "charging_option": "fast_charge", "points_awarded": 0, "min_soc": 80, "leave_by": "09:30"},
+    {"priority": "low", "charging_option": "eco_charge", "points_awarded": 100, "min_soc": 100, "leave_by": None},
+]
+MEMORY_LINES = [render_memory_line(req) for req in RECENT]  # Rendered when each request was queued
+USER_TEXT = "A user with approximately 15% battery says: 'My car is at 15%. I just need a full charge by tomorrow morning, please.'."
+
+
+def build_before(now: datetime, grid_status: str, recent_requests: list, user_text: str):
+    current_time_str = now.strftime("%H:%M")
+    memory_context = ""
+    if recent_requests:
+        memory_context += "\n**Short-Term Memory (What just happened):**\n"
+        for req in recent_requests:
+            memory_context += f"- A user with '{req['priority']}' priority got '{req['charging_option']}' and {req['points_awarded']} points.\n"
+
+    system_prompt = f"""You are a hyper-efficient EV Charging Bot. Your only goal is to parse user text and output a perfect JSON charging plan.
+
+**Current Time**: {current_time_str}
+**Grid Status**: {grid_status.upper()}
+
+{memory_context}
+
+**Core Rules:**
+1.  **Parse SoCs**: Find `start_soc` ('at 5%', 'dead'=5) and `min_soc` ('need 80%'). If not found, use `null`.
+2.  **Parse Leave By**: Find `leave_by` time (e.g., 'flight to catch' = +2 hours from current time). If none, use `null`.
+3.  **Determine Priority**: `high` (urgent), `medium` (deadline), `low` (flexible).
+4.  **Choose Plan (Grid Logic)**:
+    *   If grid is **STABLE**: Always `fast_charge` (10 pts).
+    *   If grid is **STRESSED**: `high` priority -> `fast_charge` (0 pts); `medium`/`low` -> `eco_charge` (100 pts).
+5.  **Calculate Pickup Time**: Start from **{current_time_str}**. `fast_charge` adds 45 mins. `eco_charge` adds 3 hours. Calculate the final `HH:MM` time.
+6.  **Reasoning**: Briefly explain your decision.
+
+**Output Format**: For the request below, return a single, valid JSON object. All keys are required.
+"""
+    final_prompt = f"{system_prompt}\n**New Request**: {user_text}"
+    config = GenerateContentConfig(
+        temperature=0.0,
+        response_mime_type="application/json",
+        response_schema=Schema(
+            type=Type.OBJECT,
+            properties={
+                'start_soc': Schema(type=Type.INTEGER, nullable=True),
+                'priority': Schema(type=Type.STRING),
+                'leave_by': Schema(type=Type.STRING, nullable=True),
+                'min_soc': Schema(type=Type.INTEGER, nullable=True),
+                'charging_option': Schema(type=Type.STRING),
+                'points_awarded': Schema(type=Type.INTEGER),
+                'pickup_time': Schema(type=Type.STRING),
+                'reasoning': Schema(type=Type.STRING, nullable=True),
+            },
+            required=["start_soc", "priority", "leave_by", "min_soc", "charging_option", "points_awarded", "pickup_time"]
+        )
+    )
+    return final_prompt, config
+
+
+def build_after(now: datetime, grid_status: str, recent_requests: list, user_text: str):
+    return build_intent_prompt(now, MEMORY_LINES, user_text), SINGLE_INTENT_CONFIG
+
+
+if __name__ == "__main__":
+    now = datetime.now()
+    before_prompt, _ = build_before(now, "stressed", RECENT, USER_TEXT)
+    after_prompt, _ = build_after(now, "stressed", RECENT, USER_TEXT)
+
+    number = 20_000
+    before = min(timeit.repeat(lambda: build_before(now, "stressed", RECENT, USER_TEXT), number=number, repeat=5)) / number
+    after = min(timeit.repeat(lambda: build_after(now, "stressed", RECENT, USER_TEXT), number=number, repeat=5)) / number
+
+    print(f"prompt size: {len(before_prompt)} -> {len(after_prompt)} chars (~{len(after_prompt) // 4} tokens), "
+          f"{SINGLE_INTENT_PROMPT.static_chars} of them static")
+    print(f"required output keys: 7 -> {len(INTENT_REQUIRED_KEYS)}")
+    print(f"before: {before * 1e6:8.2f} us per call (f-string prompt + new GenerateContentConfig/Schema)")
+    print(f"after:  {after * 1e6:8.2f} us per call (precompiled template + shared config)")
+    print(f"speed-up: {before / after:.1f}x")
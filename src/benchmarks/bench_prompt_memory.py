@@ -0,0 +1,84 @@
+"""Benchmark: assembling the prompt's short-term memory at growing queue sizes.
+
+Three generations of the same step. The asking user is among the most recent
+entries, which is the common case of a driver re-negotiating.
+
+* "scan" is the orchestrator's original path. It walks the whole queue as a
+  list, `model_dump()`s every request from another user and keeps the last
+  two. It grows with the queue.
+* "latest" is the path once the queue became a ChargeQueue, whose `latest()`
+  walks back from the newest entry. Only two requests are dumped, so the
+  queue-sized cost was already gone before the ring buffer.
+* "buffer" reads the lines that RecentDecisions rendered when each request
+  was queued.
+
+Run from the `src` directory:  python3 benchmarks/bench_prompt_memory.py
+"""
+import os
+import random
+import sys
+import timeit
+
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+from prompts import RecentDecisions, render_memory_context, render_memory_line
+
+PRIORITIES = ["high", "medium", "low"]
+
+
+class QueuedRequest(BaseModel):  # The orchestrator's InternalChargeRequest fields
+    user_did: str; priority: str; leave_by: str | None = None; min_soc: int | None = None
+    start_soc: int | None = None; original_text: str; received_at: float
+    charging_option: str | None = None; points_awarded: int = 0
+    pickup_time: str | None = None; is_grid_stressed_at_request: bool = False
+
+
+def make_request(i: int) -> QueuedRequest:
+    return QueuedRequest(user_did=f"did:bench:{i}", priority=random.choice(PRIORITIES), leave_by="18:00", min_soc=80,
+                         start_soc=40, original_text="need a charge", received_at=float(i), charging_option="fast_charge",
+                         points_awarded=10, pickup_time="18:45")
+
+
+def from_scan(requests: list, user_did: str) -> str:
+    recent = [r.model_dump() for r in requests if r.user_did != user_did][-2:]
+    return render_memory_context([render_memory_line(r) for r in recent])
+
+
+def from_latest(queue: ChargeQueue, user_did: str) -> str:
+    recent = [r.model_dump() for r in queue.latest(2, exclude_user_did=user_did)]
+    return render_memory_context([render_memory_line(r) for r in recent])
+
+
+def from_buffer(recent: RecentDecisions, user_did: str) -> str:
+    return render_memory_context(recent.lines(exclude_user_did=user_did))
+
+
+def per_call(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def run(size: int, number: int = 20_000):
+    requests, queue, recent = [], ChargeQueue(), RecentDecisions(2)
+    for i in range(size):
+        request = make_request(i)
+        requests.append(request)
+        queue.upsert(request)
+        recent.record(request.model_dump())
+    asking = f"did:bench:{size - 1}"
+    assert from_scan(requests, asking) == from_latest(queue, asking) == from_buffer(recent, asking)
+    scan = per_call(lambda: from_scan(requests, asking), max(number * 100 // size, 5))
+    latest = per_call(lambda: from_latest(queue, asking), number)
+    buffer = per_call(lambda: from_buffer(recent, asking), number)
+    queued = make_request(size // 2).model_dump()  # The orchestrator records the dict it already has
+    record = per_call(lambda: recent.record(queued), number)
+    print(f"{size:>8,} queued | scan {scan * 1e6:10.1f} us | latest {latest * 1e6:6.2f} us | buffer {buffer * 1e6:6.2f} us"
+          f" | record on enqueue {record * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    random.seed(2)
+    for size in (100, 10_000, 100_000):
+        run(size)
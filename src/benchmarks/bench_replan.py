@@ -0,0 +1,81 @@
+"""Benchmark: re-planning the whole queue after a grid flip.
+
+Times `replan_queue` for both directions of the flip, plus encoding the
+single SSE event that carries the result. The naive version is shown for
+comparison: one new entry and one upsert per request, each of which would
+also be published as its own event. Entries are plain objects with the
+InternalChargeRequest fields (pydantic models keep their fields in
+`__dict__` the same way).
+
+Run from the `src` directory:  python3 benchmarks/bench_replan.py
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+from charging_plan import ChargingPolicy, replan_queue
+
+PRIORITIES = ["high", "medium", "low"]
+POLICY = ChargingPolicy()
+
+
+def filled_queue(size: int) -> ChargeQueue:
+    queue = ChargeQueue()
+    now = datetime.now()
+    for i in range(size):
+        priority = random.choice(PRIORITIES)
+        option, points = POLICY.plan_for(priority, False)
+        queue.upsert(SimpleNamespace(
+            user_did=f"did:bench:{i}", priority=priority, leave_by="18:00", min_soc=80, start_soc=40,
+            original_text="need a charge", received_at=time.time(), charging_option=option, points_awarded=points,
+            pickup_time=POLICY.pickup_time_for(option, now), is_grid_stressed_at_request=False))
+    return queue
+
+
+def naive_replan(queue: ChargeQueue, grid_stressed: bool, changed_at: datetime) -> list:
+    changed = []
+    for request in list(queue):
+        option, points = POLICY.plan_for(request.priority, grid_stressed)
+        if request.charging_option == option and request.points_awarded == points:
+            continue
+        updated = SimpleNamespace(**{**vars(request), "charging_option": option, "points_awarded": points})
+        if request.charging_option != option:
+            updated.pickup_time = POLICY.pickup_time_for(option, changed_at)
+        queue.upsert(updated)
+        changed.append(json.dumps(vars(updated)))
+    return changed
+
+
+def run(size: int, rounds: int = 20):
+    queue = filled_queue(size)
+    timings = {True: [], False: []}
+    encode = []
+    for i in range(rounds * 2):
+        stressed = i % 2 == 0
+        started = time.perf_counter()
+        groups = replan_queue(queue, POLICY, stressed, datetime.now())
+        timings[stressed].append(time.perf_counter() - started)
+        started = time.perf_counter()
+        event = json.dumps({"is_grid_stressed": stressed, "changed_at": time.time(), "replan": groups})
+        encode.append(time.perf_counter() - started)
+    changed = sum(len(group["user_dids"]) for group in groups)
+
+    started = time.perf_counter()
+    naive_replan(queue, True, datetime.now())
+    naive = time.perf_counter() - started
+    print(f"{size:>7,} queued | to stressed {min(timings[True]) * 1e3:6.2f} ms | to stable {min(timings[False]) * 1e3:6.2f} ms"
+          f" | event {min(encode) * 1e3:5.2f} ms ({len(event) / 1024:6.1f} KiB, {changed:,} entries)"
+          f" | naive {naive * 1e3:7.2f} ms")
+
+
+if __name__ == "__main__":
+    random.seed(5)
+    for size in (1_000, 10_000, 50_000):
+        run(size)
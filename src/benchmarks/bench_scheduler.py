@@ -0,0 +1,83 @@
+"""Benchmark: ChargerScheduler incremental rescheduling vs. a full recompute.
+
+For each queue size a site with hundreds of chargers (three power classes)
+is loaded, then one change is applied and the plan is read back, the way
+every /api/status rebuild does after an arrival or departure:
+  * low arrival  - a flexible driver joins (lands near the back of the order)
+  * high arrival - an urgent driver joins (shifts almost everyone)
+  * departure    - a random queued driver leaves
+  * full         - the same plan computed from scratch
+
+Run from the `src` directory:  python3 benchmarks/bench_scheduler.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scheduler import ChargerScheduler, parse_topology
+
+PRIORITIES = ["high", "medium", "low"]
+LEAVE_BY = [None, None, "08:30", "12:00", "17:45", "21:00"]
+
+
+def make_session(i: int, priority: str | None = None) -> tuple:
+    return (f"did:denso:user:bench:{i}", priority or random.choice(PRIORITIES), random.choice(LEAVE_BY),
+            time.time() + i * 1e-3, random.uniform(5, 60))
+
+
+def loaded(topology: str, size: int) -> tuple[ChargerScheduler, list]:
+    sessions = [make_session(i) for i in range(size)]
+    scheduler = ChargerScheduler(parse_topology(topology))
+    for session in sessions:
+        scheduler.upsert(*session)
+    scheduler.plan()
+    return scheduler, sessions
+
+
+def per_change(scheduler: ChargerScheduler, changes: list) -> float:
+    """Mean seconds for one change followed by a plan read."""
+    started = time.perf_counter()
+    for change in changes:
+        change()
+        scheduler.plan()
+    return (time.perf_counter() - started) / len(changes)
+
+
+def run(topology: str, size: int, changes: int = 200):
+    scheduler, sessions = loaded(topology, size)
+    next_id = size
+
+    def arrival(priority):
+        def change():
+            nonlocal next_id
+            session = make_session(next_id, priority)
+            next_id += 1
+            scheduler.upsert(*session)
+            sessions.append(session)
+        return change
+
+    def departure():
+        session = sessions.pop(random.randrange(len(sessions)))
+        scheduler.remove(session[0])
+
+    low = per_change(scheduler, [arrival("low")] * changes)
+    high = per_change(scheduler, [arrival("high")] * changes)
+    leave = per_change(scheduler, [departure] * changes)
+    started = time.perf_counter()
+    for _ in range(5):
+        full = ChargerScheduler(parse_topology(topology))
+        for session in sessions:
+            full.upsert(*session)
+        full.plan()
+    rebuild = (time.perf_counter() - started) / 5
+    print(f"{size:>7,} sessions / {len(scheduler.chargers)} chargers | low arrival {low * 1e3:7.3f} ms | "
+          f"high arrival {high * 1e3:7.3f} ms | departure {leave * 1e3:7.3f} ms | full {rebuild * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    random.seed(7)
+    for size in (1_000, 5_000, 10_000):
+        run("200x22,80x50,20x150", size)
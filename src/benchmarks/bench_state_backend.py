@@ -0,0 +1,91 @@
+"""Benchmark: SQLiteSharedBackend with several writer processes on one file.
+
+Every queue change in multi-worker mode is one small transaction, committed
+on the backend's writer thread, so the shared file's write ceiling bounds the
+whole deployment. This runs N
+processes that each upsert `--ops` requests and then reports aggregate
+writes/s, plus the cost of `sync()` when nothing changed (paid on every read).
+
+Run from the `src` directory:  python3 benchmarks/bench_state_backend.py [--processes 1 2 4]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+from credential_store import CredentialStore
+from state_backend import SQLiteSharedBackend
+
+
+class BenchRequest(SimpleNamespace):
+    def model_dump(self) -> dict:
+        return dict(vars(self))
+
+    def model_dump_json(self) -> str:
+        return json.dumps(vars(self))
+
+
+def make_backend(path: str) -> SQLiteSharedBackend:
+    backend = SQLiteSharedBackend(ChargeQueue(), CredentialStore(), BenchRequest, path)
+    backend.load()
+    return backend
+
+
+async def upsert_all(backend: SQLiteSharedBackend, worker: int, ops: int):
+    for i in range(ops):
+        await backend.upsert_request(BenchRequest(user_did=f"did:bench:{worker}:{i % 500}", priority="medium",
+                                                  original_text="Need a charge before 5pm.", received_at=time.time()))
+
+
+def writer(path: str, worker: int, ops: int, start, results):
+    backend = make_backend(path)
+    start.wait()
+    started = time.perf_counter()
+    asyncio.run(upsert_all(backend, worker, ops))
+    results.put(time.perf_counter() - started)
+    backend.close()
+
+
+def run(processes: int, ops: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        make_backend(path).close()
+        start, results = multiprocessing.Event(), multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=writer, args=(path, w, ops, start, results)) for w in range(processes)]
+        for process in workers:
+            process.start()
+        time.sleep(0.5)
+        start.set()
+        elapsed = max(results.get() for _ in workers)
+        for process in workers:
+            process.join()
+    return processes * ops / elapsed
+
+
+def idle_sync_cost(repeat: int = 20_000) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = make_backend(os.path.join(tmp, "shared.db"))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            backend.sync()
+        elapsed = time.perf_counter() - started
+        backend.close()
+    return elapsed / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--ops", type=int, default=5_000, help="upserts per process")
+    args = parser.parse_args()
+    print(f"idle sync(): {idle_sync_cost() * 1e6:.1f} us")
+    for processes in args.processes:
+        print(f"{processes} writer process(es): {run(processes, args.ops):10,.0f} upserts/s aggregate")
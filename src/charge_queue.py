@@ -0,0 +1,108 @@
+"""Indexed charging queue used by the orchestrator.
+
+Holds at most one request per `user_did`. Requests are kept in per-priority
+buckets so that upserts and removals never touch the rest of the queue and the
+priority-ordered view is produced without re-sorting on every status poll.
+"""
+
+PRIORITY_RANK = {"high": 3, "medium": 2, "low": 1}
+_RANK_LABELS = {rank: label for label, rank in PRIORITY_RANK.items()}
+
+
+def priority_rank(priority) -> int:
+    """Numeric rank of a priority label; unknown labels sort after 'low'."""
+    return PRIORITY_RANK.get(priority, 0)
+
+
+class ChargeQueue:
+    """One-entry-per-user charging queue ordered by priority, then arrival.
+
+    * `_by_user` maps user_did -> request in arrival order (a re-request moves the
+      user to the back, exactly like the old "drop then append" list logic).
+    * `_buckets` maps priority rank -> {user_did: request}, also in arrival order.
+
+    Upsert and removal are O(1); ordered iteration is O(n) over the live entries
+    with only the handful of distinct priority ranks being sorted.
+
+    `version` increases on every mutation, so readers can cache anything derived
+    from the queue (e.g. the serialized /api/status payload) until it changes.
+    """
+
+    def __init__(self):
+        self._by_user = {}
+        self._buckets = {}
+        self.version = 0
+
+    def upsert(self, request):
+        """Adds `request`, replacing any previous entry for the same user. Returns the old entry."""
+        previous = self.remove(request.user_did)
+        rank = priority_rank(request.priority)
+        self._by_user[request.user_did] = request
+        bucket = self._buckets.get(rank)
+        if bucket is None:
+            bucket = self._buckets[rank] = {}
+        bucket[request.user_did] = request
+        self.version += 1
+        return previous
+
+    def remove(self, user_did: str):
+        """Removes and returns the user's entry, or None if they are not queued."""
+        request = self._by_user.pop(user_did, None)
+        if request is None:
+            return None
+        rank = priority_rank(request.priority)
+        bucket = self._buckets[rank]
+        del bucket[user_did]
+        if not bucket:
+            del self._buckets[rank]
+        self.version += 1
+        return request
+
+    def clear(self):
+        """Drops every entry (e.g. before rebuilding from shared storage)."""
+        self._by_user.clear()
+        self._buckets.clear()
+        self.version += 1
+
+    def touch(self):
+        """Records that entries were changed in place (their priority and user must stay the same)."""
+        self.version += 1
+
+    def get(self, user_did: str):
+        return self._by_user.get(user_did)
+
+    def latest(self, count: int, exclude_user_did: str | None = None) -> list:
+        """The `count` most recently queued requests (oldest first), skipping one user.
+
+        Walks back from the newest entry, so the cost does not grow with the queue.
+        """
+        found = []
+        for user_did in reversed(self._by_user):
+            if len(found) >= count:
+                break
+            if user_did != exclude_user_did:
+                found.append(self._by_user[user_did])
+        found.reverse()
+        return found
+
+    def counts_by_priority(self) -> dict:
+        """Number of queued requests per priority label."""
+        counts = {}
+        for rank, bucket in self._buckets.items():
+            if rank in _RANK_LABELS:
+                counts[_RANK_LABELS[rank]] = len(bucket)
+                continue
+            for request in bucket.values():
+                counts[request.priority] = counts.get(request.priority, 0) + 1
+        return counts
+
+    def __iter__(self):
+        """Iterates requests by priority (high first), then by arrival."""
+        for rank in sorted(self._buckets, reverse=True):
+            yield from self._buckets[rank].values()
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    def __contains__(self, user_did) -> bool:
+        return user_did in self._by_user
@@ -0,0 +1,63 @@
+"""Charge-time model: how long a session needs from one SoC to another.
+
+The power going into the battery is limited by two things:
+
+* the charger, i.e. what it (or the power allocation) delivers, and
+* the vehicle, which accepts `vehicle_max_kw * taper(soc)`.
+
+`taper` is a piecewise-linear share of the vehicle's peak power that falls
+as the battery fills (TAPER_CURVE: full power up to 50%, about half at 80%,
+a trickle near 100%). Because the taper never rises, there is one crossover
+SoC below which the charger is the limit and above which the vehicle is:
+
+    minutes = E/100 * ((s_cross - s0) / P  +  (C(s1) - C(s_cross)) / V) / efficiency * 60
+
+Here E is the battery capacity in kWh, P the charger power and V the
+vehicle peak, with s_cross clamped into [s0, s1]. C(s) = integral of
+1 / taper from 0 to s, tabulated once on a fine SoC grid. The estimate for
+any number of sessions, each with its own SoCs and power, is a handful of
+vectorized array operations.
+"""
+import numpy as np
+
+TAPER_CURVE = ((0, 1.0), (50, 1.0), (65, 0.8), (80, 0.5), (90, 0.3), (100, 0.1))  # (SoC %, share of peak power)
+
+
+class ChargeTimeModel:
+    def __init__(self, vehicle_max_kw: float = 150.0, efficiency: float = 0.92, curve: tuple = TAPER_CURVE,
+                 resolution: float = 0.05):
+        curve_soc, curve_share = (np.asarray(column, dtype=float) for column in zip(*curve))
+        if curve_soc[0] != 0 or curve_soc[-1] != 100 or np.any(np.diff(curve_soc) <= 0):
+            raise ValueError("Taper curve SoCs must rise strictly from 0 to 100")
+        if np.any(np.diff(curve_share) > 0) or curve_share[-1] <= 0:
+            raise ValueError("Taper curve shares must be positive and never rise")
+        self.vehicle_max_kw = vehicle_max_kw
+        self.efficiency = efficiency
+        self._curve_soc, self._curve_share = curve_soc, curve_share
+        self._soc = np.linspace(0.0, 100.0, int(round(100 / resolution)) + 1)
+        inverse = 1.0 / np.interp(self._soc, curve_soc, curve_share)
+        # C(s) by the trapezoid rule; exact enough at this resolution for minute-level estimates.
+        self._inverse_taper_integral = np.concatenate(([0.0], np.cumsum((inverse[1:] + inverse[:-1]) / 2 * np.diff(self._soc))))
+
+    def max_power_kw(self, soc) -> np.ndarray:
+        """Power the vehicle accepts at `soc`."""
+        return self.vehicle_max_kw * np.interp(soc, self._curve_soc, self._curve_share)
+
+    def minutes(self, start_soc, target_soc, power_kw, battery_kwh) -> np.ndarray:
+        """Minutes to charge from start_soc to target_soc (%) at up to power_kw; arrays broadcast.
+
+        0 if the target is already reached; inf if power is needed but none is available.
+        """
+        s0 = np.clip(np.asarray(start_soc, dtype=float), 0.0, 100.0)
+        s1 = np.maximum(np.clip(np.asarray(target_soc, dtype=float), 0.0, 100.0), s0)
+        power = np.asarray(power_kw, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # The curve falls, so reversed it rises: the SoC where the vehicle's limit drops below the charger's.
+            crossover = np.interp(power / self.vehicle_max_kw, self._curve_share[::-1], self._curve_soc[::-1])
+            cross = np.clip(crossover, s0, s1)
+            charger_limited = (cross - s0) / power
+            vehicle_limited = (np.interp(s1, self._soc, self._inverse_taper_integral)
+                               - np.interp(cross, self._soc, self._inverse_taper_integral)) / self.vehicle_max_kw
+            hours = np.asarray(battery_kwh, dtype=float) / 100 * (charger_limited + vehicle_limited) / self.efficiency
+        hours = np.where(power > 0, hours, np.inf)
+        return np.where(s1 > s0, hours * 60, 0.0)
@@ -0,0 +1,174 @@
+"""Charging policy: charging option, points and pickup time for a request.
+
+These fields follow from the grid status and the request's priority alone.
+They are computed here from a declarative rule table instead of by the
+model, which only extracts the intent (SoCs, deadline, priority). The table
+lives in a JSON file that is reloaded when it changes:
+
+    {
+      "pickup_minutes": {"fast_charge": 45, "eco_charge": 180},
+      "rules": [
+        {"grid": "stable", "charging_option": "fast_charge", "points_awarded": 10},
+        {"grid": "stressed", "priority": "high", "charging_option": "fast_charge", "points_awarded": 0},
+        {"grid": "stressed", "charging_option": "eco_charge", "points_awarded": 100}
+      ]
+    }
+
+The first rule that matches wins. `grid` ("stable"/"stressed") and
+`priority` (a label or a list of labels) are optional and match anything
+when left out. On load the table is compiled into a lookup per (grid,
+priority), so every combination must be covered.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from charge_queue import PRIORITY_RANK
+
+DEFAULT_POLICY = {
+    "pickup_minutes": {"fast_charge": 45, "eco_charge": 180},
+    "rules": [
+        {"grid": "stable", "charging_option": "fast_charge", "points_awarded": 10},
+        {"grid": "stressed", "priority": "high", "charging_option": "fast_charge", "points_awarded": 0},
+        {"grid": "stressed", "charging_option": "eco_charge", "points_awarded": 100},
+    ],
+}
+GRID_STATES = {"stable": False, "stressed": True}
+
+
+def compile_policy(table: dict) -> tuple[dict, dict]:
+    """Returns ({(grid_stressed, priority or None): (option, points)}, {option: pickup timedelta}).
+
+    Raises ValueError if the table is malformed or leaves a combination uncovered.
+    """
+    try:
+        offsets = {option: timedelta(minutes=float(minutes)) for option, minutes in table["pickup_minutes"].items()}
+        rules = list(table["rules"])
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        raise ValueError(f"Policy needs 'pickup_minutes' and 'rules': {e}") from e
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {rule!r} must be an object")
+        if rule.get("grid") is not None and (not isinstance(rule["grid"], str) or rule["grid"] not in GRID_STATES):
+            raise ValueError(f"Rule {rule} has grid {rule['grid']!r}; expected one of {sorted(GRID_STATES)}")
+        labels = rule.get("priority")
+        if not (labels is None or isinstance(labels, str)
+                or isinstance(labels, list) and all(isinstance(label, str) for label in labels)):
+            raise ValueError(f"Rule {rule} needs priority as a label or a list of labels")
+    plans = {}
+    for stressed in GRID_STATES.values():
+        for priority in (*PRIORITY_RANK, None):  # None: any other label
+            for rule in rules:
+                grid = rule.get("grid")
+                if grid is not None and GRID_STATES[grid] != stressed:
+                    continue
+                labels = rule.get("priority")
+                if labels is not None and priority not in ([labels] if isinstance(labels, str) else labels):
+                    continue
+                option = rule.get("charging_option")
+                if not isinstance(option, str) or option not in offsets or not isinstance(rule.get("points_awarded"), int):
+                    raise ValueError(f"Rule {rule} needs a charging_option listed in pickup_minutes and integer points_awarded")
+                plans[(stressed, priority)] = (rule["charging_option"], rule["points_awarded"])
+                break
+            else:
+                raise ValueError(f"No rule for priority {priority!r} on a {'stressed' if stressed else 'stable'} grid")
+    return plans, offsets
+
+
+def table_digest(table: dict) -> str:
+    return hashlib.sha1(json.dumps(table, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+class ChargingPolicy:
+    def __init__(self, path: str | None = None):
+        """Rules from `path` when it exists, otherwise DEFAULT_POLICY."""
+        self.path = path
+        self.table = DEFAULT_POLICY
+        self._plans, self._offsets = compile_policy(DEFAULT_POLICY)
+        self.digest = table_digest(DEFAULT_POLICY)  # Same rules, same digest, in every worker
+        self._mtime = None
+        self.version = 0  # Bumped on every successful (re)load
+        self.reload_errors = 0
+        self.reload()
+
+    def reload(self) -> bool:
+        """Re-reads the file if it changed since the last load. Returns True if new rules were loaded.
+
+        A file that fails to read, parse or validate is counted and re-raised; the previous rules stay in force.
+        """
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            with open(self.path) as f:
+                table = json.load(f)
+            plans, offsets = compile_policy(table)
+        except Exception:
+            self.reload_errors += 1
+            raise
+        self.table, self._plans, self._offsets = table, plans, offsets
+        self.digest = table_digest(table)
+        self.version += 1
+        return True
+
+    # --- Lookups ---
+    def plan_for(self, priority: str, grid_stressed: bool) -> tuple[str, int]:
+        """(charging_option, points_awarded) for a priority under the given grid state."""
+        plan = self._plans.get((grid_stressed, priority))
+        return plan if plan is not None else self._plans[(grid_stressed, None)]
+
+    def pickup_time_for(self, charging_option: str | None, now: datetime) -> str:
+        offset = self._offsets.get(charging_option) or min(self._offsets.values())
+        return (now + offset).strftime("%H:%M")
+
+    def apply(self, intent: dict, grid_stressed: bool, now: datetime) -> dict:
+        """Adds charging_option, points_awarded and pickup_time to an extracted intent (in place)."""
+        option, points = self.plan_for(intent.get("priority"), grid_stressed)
+        intent.update(charging_option=option, points_awarded=points, pickup_time=self.pickup_time_for(option, now))
+        return intent
+
+    def stats(self) -> dict:
+        return {"path": self.path, "version": self.version, "digest": self.digest, "reload_errors": self.reload_errors,
+                "table": self.table}
+
+
+def replan_queue(queue, policy: ChargingPolicy, grid_stressed: bool, changed_at: datetime) -> list[dict]:
+    """Re-applies `policy` to every queued request in place, in one pass.
+
+    Requests whose charging_option changes get a new pickup_time counted from
+    `changed_at`; the others only have their points updated.
+    `is_grid_stressed_at_request` is left as it was.
+
+    Returns the changes grouped by what was written:
+    [{"fields": {...}, "user_dids": [...]}, ...]. Requests that already match
+    the new plan are not listed.
+    """
+    plans = {}  # priority -> (option, points, group for moved requests, group for re-pointed ones)
+    for request in queue:
+        plan = plans.get(request.priority)
+        if plan is None:
+            option, points = policy.plan_for(request.priority, grid_stressed)
+            plan = plans[request.priority] = (
+                option, points,
+                {"fields": {"charging_option": option, "points_awarded": points,
+                            "pickup_time": policy.pickup_time_for(option, changed_at)}, "user_dids": []},
+                {"fields": {"points_awarded": points}, "user_dids": []})
+        option, points, moved, repointed = plan
+        # Plain __dict__ writes: the values come from the policy, so there is nothing to validate per request.
+        if request.charging_option != option:
+            vars(request).update(moved["fields"])
+            moved["user_dids"].append(request.user_did)
+        elif request.points_awarded != points:
+            vars(request)["points_awarded"] = points
+            repointed["user_dids"].append(request.user_did)
+    groups = [group for plan in plans.values() for group in plan[2:] if group["user_dids"]]
+    if groups:
+        queue.touch()
+    return groups
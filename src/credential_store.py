@@ -0,0 +1,135 @@
+"""Bounded store for the SoC credentials issued to drivers (replaces the `USER_VCS` dict).
+
+Each driver holds at most one credential. Records are slotted objects with the
+credential ID kept as 16 raw bytes and the DID interned, so repeat
+negotiations from the same driver share one string. The store is capped:
+
+* Credentials expire `ttl_seconds` after issue (their validity period) and are
+  purged lazily, oldest first, on every write.
+* Above `max_size`, the least recently used credential is evicted.
+
+The W3C-shaped dict is only built when a caller asks for it (`CredentialRecord.to_vc`).
+"""
+import sys
+import time
+import uuid
+from collections import OrderedDict
+
+
+class CredentialRecord:
+    __slots__ = ("user_did", "credential_id", "soc_percent", "issued_at", "expires_at")
+
+    def __init__(self, user_did: str, soc_percent: int, issued_at: float, expires_at: float, credential_id: bytes | None = None):
+        self.user_did = user_did
+        self.credential_id = credential_id or uuid.uuid4().bytes
+        self.soc_percent = soc_percent
+        self.issued_at = issued_at
+        self.expires_at = expires_at
+
+    def to_vc(self) -> dict:
+        return {
+            "id": f"urn:uuid:{uuid.UUID(bytes=self.credential_id)}",
+            "issuanceDate": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.issued_at)),
+            "expirationDate": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.expires_at)),
+            "credentialSubject": {"id": self.user_did, "claims": {"soc_percent": self.soc_percent}},
+        }
+
+
+class CredentialStore:
+    def __init__(self, max_size: int = 100_000, ttl_seconds: float = 86_400):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._records = OrderedDict()  # user_did -> CredentialRecord, least recently used first
+        self._by_expiry = OrderedDict()  # user_did -> None, in issue order (== expiry order, TTL is uniform)
+        self.issued = 0
+        self.updated = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def issue_or_update(self, user_did: str, soc_percent: int, now: float | None = None) -> tuple[CredentialRecord, str]:
+        """Issues a fresh credential for `user_did`, replacing any previous one. Returns (record, "issued" | "updated")."""
+        now = time.time() if now is None else now
+        self.purge_expired(now)
+        user_did = sys.intern(user_did)
+        action = "updated" if user_did in self._records else "issued"
+        record = CredentialRecord(user_did, soc_percent, now, now + self.ttl_seconds)
+        self._records[user_did] = record
+        self._records.move_to_end(user_did)
+        self._by_expiry[user_did] = None
+        self._by_expiry.move_to_end(user_did)
+        if action == "issued":
+            self.issued += 1
+        else:
+            self.updated += 1
+        while len(self._records) > self.max_size:
+            evicted, _ = self._records.popitem(last=False)
+            del self._by_expiry[evicted]
+            self.evictions += 1
+        return record, action
+
+    def restore(self, user_did: str, credential_id: bytes, soc_percent: int, issued_at: float, expires_at: float):
+        """Re-inserts a persisted credential as-is (call in issue order). Counts as neither issue nor update."""
+        user_did = sys.intern(user_did)
+        record = CredentialRecord(user_did, soc_percent, issued_at, expires_at, credential_id)
+        self._records[user_did] = record
+        self._by_expiry[user_did] = None
+        while len(self._records) > self.max_size:
+            evicted, _ = self._records.popitem(last=False)
+            del self._by_expiry[evicted]
+
+    def get(self, user_did: str, now: float | None = None) -> CredentialRecord | None:
+        """Returns the driver's valid credential, or None if there is none or it has expired."""
+        record = self._records.get(user_did)
+        if record is None:
+            return None
+        if record.expires_at <= (time.time() if now is None else now):
+            self._drop(user_did)
+            self.expirations += 1
+            return None
+        self._records.move_to_end(user_did)
+        return record
+
+    def purge_expired(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        purged = 0
+        while self._by_expiry:
+            user_did = next(iter(self._by_expiry))
+            if self._records[user_did].expires_at > now:
+                break
+            self._drop(user_did)
+            purged += 1
+        self.expirations += purged
+        return purged
+
+    def _drop(self, user_did: str):
+        del self._records[user_did]
+        del self._by_expiry[user_did]
+
+    def __contains__(self, user_did: str) -> bool:
+        return self.get(user_did) is not None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the store: both indexes, the records and their fields."""
+        total = sys.getsizeof(self._records) + sys.getsizeof(self._by_expiry)
+        for record in self._records.values():
+            total += (sys.getsizeof(record) + sys.getsizeof(record.user_did) + sys.getsizeof(record.credential_id)
+                      + sys.getsizeof(record.issued_at) + sys.getsizeof(record.expires_at))
+        return total
+
+    def stats(self) -> dict:
+        size = len(self._records)
+        memory = self.memory_bytes()
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "issued": self.issued,
+            "updated": self.updated,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_bytes": memory,
+            "bytes_per_credential": round(memory / size, 1) if size else 0.0,
+        }
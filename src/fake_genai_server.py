@@ -0,0 +1,142 @@
+"""Local stand-in for the Gemini `generateContent` API, for offline load tests and benchmarks.
+
+Point the orchestrator at it with GENAI_BASE_URL:
+
+    python3 fake_genai_server.py --profile realistic --port 8090
+    GENAI_BASE_URL=http://127.0.0.1:8090 python3 orchestrator.py
+
+It implements the JSON-schema response contract used by the orchestrator:
+the prompt's request(s) are parsed with the rule-based fast-path extractor and
+the resulting intent is shaped to the `responseSchema` that was sent (a single
+object, or an array of indexed objects for micro-batched calls). Latency,
+server errors, rate limiting and malformed output are drawn from a tunable,
+seeded profile so runs are reproducible. The profile can be swapped at runtime
+via POST /_fake/profile; counters are at GET /_fake/stats.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from datetime import datetime
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from fast_intent import extract_fast_intent
+
+PROFILES = {
+    # median_ms / sigma describe a log-normal latency distribution.
+    "instant": {"median_ms": 0, "sigma": 0.0, "error_rate": 0.0, "rate_limit_rate": 0.0, "malformed_rate": 0.0},
+    "fast": {"median_ms": 150, "sigma": 0.3, "error_rate": 0.0, "rate_limit_rate": 0.0, "malformed_rate": 0.0},
+    "realistic": {"median_ms": 900, "sigma": 0.5, "error_rate": 0.01, "rate_limit_rate": 0.0, "malformed_rate": 0.005},
+    "flaky": {"median_ms": 1200, "sigma": 0.9, "error_rate": 0.05, "rate_limit_rate": 0.05, "malformed_rate": 0.05},
+    "overloaded": {"median_ms": 3000, "sigma": 1.0, "error_rate": 0.1, "rate_limit_rate": 0.3, "malformed_rate": 0.02},
+}
+
+_SINGLE_REQUEST = re.compile(r"\*\*New Request\*\*:\s*(.+)", re.DOTALL)
+_BATCH_ITEM = re.compile(r"^\[(\d+)\]\s*(.+)$", re.MULTILINE)
+
+app = FastAPI(title="Fake Gemini API", description="Local generateContent stand-in with configurable latency and failures.")
+STATE = {"profile_name": "fast", "profile": dict(PROFILES["fast"]), "rng": random.Random(0)}
+STATS = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0}
+
+
+def _error(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+
+def _value_for(schema: dict, intent: dict, key: str):
+    """Value for one schema property: from the rule-based intent when available, else a typed placeholder."""
+    if key in intent and (intent[key] is not None or schema.get("nullable")):
+        return intent[key]
+    return {"INTEGER": 0, "NUMBER": 0.0, "BOOLEAN": False, "ARRAY": []}.get(str(schema.get("type", "")).upper(), "")
+
+
+def _shape(schema: dict, intent: dict) -> dict:
+    properties = schema.get("properties", {})
+    return {key: _value_for(prop, intent, key) for key, prop in properties.items()}
+
+
+def _respond_to(prompt: str, schema: dict):
+    now = datetime.now()
+    if str(schema.get("type", "")).upper() == "ARRAY":
+        item_schema = schema.get("items", {})
+        batch_section = prompt.split("**New Requests**:", 1)[-1]
+        return [
+            _shape(item_schema, {**extract_fast_intent(text, now).intent, "index": int(index)})
+            for index, text in _BATCH_ITEM.findall(batch_section)
+        ]
+    request_match = _SINGLE_REQUEST.search(prompt)
+    text = request_match.group(1).strip() if request_match else prompt
+    return _shape(schema, extract_fast_intent(text, now).intent)
+
+
+@app.post("/{api_version}/models/{model}:generateContent")
+async def generate_content(api_version: str, model: str, request: Request):
+    profile, rng = STATE["profile"], STATE["rng"]
+    STATS["requests"] += 1
+    body = await request.json()
+
+    if profile["median_ms"] > 0:
+        await asyncio.sleep(rng.lognormvariate(0, profile["sigma"]) * profile["median_ms"] / 1000)
+
+    roll = rng.random()
+    if roll < profile["rate_limit_rate"]:
+        STATS["rate_limited"] += 1
+        return _error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+    if roll < profile["rate_limit_rate"] + profile["error_rate"]:
+        STATS["errors"] += 1
+        return _error(500, "INTERNAL", "An internal error has occurred.")
+
+    prompt = "\n".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+    config = body.get("generationConfig", {})
+    result = _respond_to(prompt, config.get("responseSchema", {}))
+    text = json.dumps(result)
+    if rng.random() < profile["malformed_rate"]:
+        STATS["malformed"] += 1
+        text = text[: max(len(text) // 2, 1)]  # Truncated JSON, like a cut-off generation
+    else:
+        STATS["ok"] += 1
+
+    prompt_tokens = len(prompt) // 4
+    output_tokens = len(text) // 4
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens, "totalTokenCount": prompt_tokens + output_tokens},
+        "modelVersion": f"fake-{model}",
+    }
+
+
+@app.post("/_fake/profile", summary="Replaces the active latency/failure profile")
+async def set_profile(request: Request):
+    body = await request.json()
+    name = body.pop("name", None)
+    base = dict(PROFILES[name]) if name in PROFILES else dict(STATE["profile"])
+    base.update({k: float(v) for k, v in body.items() if k in base})
+    if "seed" in body:
+        STATE["rng"] = random.Random(int(body["seed"]))
+    STATE.update(profile_name=name or "custom", profile=base)
+    return {"profile_name": STATE["profile_name"], "profile": base}
+
+
+@app.get("/_fake/stats", summary="Request counters since start")
+async def get_stats():
+    return {"profile_name": STATE["profile_name"], "profile": STATE["profile"], **STATS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--seed", type=int, default=0)
+    for field in ("median_ms", "sigma", "error_rate", "rate_limit_rate", "malformed_rate"):
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float, default=None, help=f"Override the profile's {field}")
+    args = parser.parse_args()
+
+    profile = dict(PROFILES[args.profile])
+    profile.update({k: v for k, v in vars(args).items() if k in profile and v is not None})
+    STATE.update(profile_name=args.profile, profile=profile, rng=random.Random(args.seed))
+    print(f"Fake Gemini API on http://127.0.0.1:{args.port} with profile '{args.profile}': {profile}")
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
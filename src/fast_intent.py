@@ -0,0 +1,108 @@
+"""Rule-based fast path for intent extraction.
+
+Most requests are trivially classifiable ("battery is dead", "I'm at 15%",
+"no rush, here all day"). `extract_fast_intent` turns such text into the
+intent fields (SoCs, deadline, priority) with precompiled regexes and scores
+how confident it is; only requests below the confidence threshold need to go
+to Gemini. The charging plan itself comes from the policy (charging_plan.py).
+"""
+import re
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+_DEAD = re.compile(r"\b(?:dead|empty|flat battery|battery is flat|out of (?:charge|battery))\b")
+_PERCENT = re.compile(r"(\d{1,3})\s*%")
+_MIN_SOC = re.compile(r"\b(?:need|needs|want|charge (?:it )?to|up to|get to|at least|until)\s+(?:at least\s+|about\s+|around\s+)?(\d{1,3})\s*%")
+_FULL_CHARGE = re.compile(r"\bfull (?:charge|battery)\b|\bfully charged\b")
+_URGENT = re.compile(r"\b(?:panic|emergency|urgent|asap|right now|immediately|hurry|flight|critical)\b")
+_DEADLINE = re.compile(r"\b(?:meeting|appointment|deadline|leave at|leaving at|pick up at)\b|\b(?:by|before) \d")
+_FLEXIBLE = re.compile(r"\b(?:no rush|all day|whenever|flexible|no hurry|take your time|overnight|tomorrow)\b")
+_CLOCK_TIME = re.compile(r"\b(?:at|by|before)\s+(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\b")
+_CLOCK_TIME_24H = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b(?!\s*[ap]\.?m\b)")
+_NEGATED = re.compile(r"(?:\b(?:not|no|never|without)|n't)(?:\s+\w+){0,2}\s+$")  # Tested against the text before a cue
+_HEDGING = re.compile(r"\b(?:but|unless|maybe|not|depends)\b|n't\b|\?")
+
+FLIGHT_LEAD_TIME = timedelta(hours=2)
+UNPARSED_DEADLINE_MAX_CONFIDENCE = 0.5  # A deadline was mentioned but not understood: leave it to the model
+
+
+class FastIntent(NamedTuple):
+    intent: dict
+    confidence: float
+
+
+def guess_start_soc(text: str, default: int | None = 50) -> int | None:
+    """Quick start-SoC guess: 'dead'/'empty' -> 5, otherwise the first 'NN%' that is not a target."""
+    text_lower = text.lower()
+    if _DEAD.search(text_lower):
+        return 5
+    targets = {m.start(1) for m in _MIN_SOC.finditer(text_lower)}
+    for match in _PERCENT.finditer(text_lower):
+        if match.start(1) not in targets and int(match.group(1)) <= 100:
+            return int(match.group(1))
+    return default
+
+
+def _parse_leave_by(text_lower: str, now: datetime) -> str | None:
+    clock = _CLOCK_TIME.search(text_lower)
+    if clock:
+        hour = int(clock.group(1)) % 12 + (12 if clock.group(3) == "p" else 0)
+        minute = int(clock.group(2) or 0)
+        if hour < 24 and minute < 60:
+            return f"{hour:02d}:{minute:02d}"
+    clock = _CLOCK_TIME_24H.search(text_lower)
+    if clock:
+        return f"{int(clock.group(1)):02d}:{clock.group(2)}"
+    if "flight" in text_lower:
+        return (now + FLIGHT_LEAD_TIME).strftime("%H:%M")
+    return None
+
+
+def extract_fast_intent(text: str, now: datetime) -> FastIntent:
+    """Extracts the intent with keyword rules and rates its confidence in [0, 1]."""
+    text_lower = text.lower()
+    deadline, flexible = bool(_DEADLINE.search(text_lower)), bool(_FLEXIBLE.search(text_lower))
+    urgent = False
+    for match in _URGENT.finditer(text_lower):
+        if _NEGATED.search(text_lower, 0, match.start()):
+            flexible = True  # "not in a hurry", "no emergency"
+        else:
+            urgent = True
+
+    if urgent and flexible:
+        priority, confidence = "medium", 0.1  # Contradictory signals: let the model decide
+    elif urgent:
+        priority, confidence = "high", 0.6
+    elif deadline:
+        priority, confidence = "medium", 0.6
+    elif flexible:
+        priority, confidence = "low", 0.6
+    else:
+        priority, confidence = "medium", 0.2
+
+    start_soc = guess_start_soc(text, default=None)
+    if start_soc is not None:
+        confidence += 0.3
+    elif priority == "high":
+        confidence += 0.1
+
+    min_soc_match = _MIN_SOC.search(text_lower)
+    min_soc = int(min_soc_match.group(1)) if min_soc_match else (100 if _FULL_CHARGE.search(text_lower) else None)
+    if min_soc is not None:
+        confidence += 0.1
+
+    if _HEDGING.search(text_lower) or len(text) > 240:
+        confidence -= 0.3
+
+    leave_by = _parse_leave_by(text_lower, now)
+    if deadline and leave_by is None:
+        confidence = min(confidence, UNPARSED_DEADLINE_MAX_CONFIDENCE)
+
+    intent = {
+        "start_soc": start_soc,
+        "priority": priority,
+        "leave_by": leave_by,
+        "min_soc": min_soc,
+        "reasoning": f"Rule-based fast path: {priority} priority.",
+    }
+    return FastIntent(intent, round(min(max(confidence, 0.0), 1.0), 2))
@@ -0,0 +1,96 @@
+"""Micro-batching stage for GenAI intent calls.
+
+Under burst load many negotiations need the model at the same moment and each
+would otherwise send the same large system prompt on its own. `IntentBatcher`
+holds submissions for a short window (or until `max_batch_size` is reached),
+resolves them with one structured-output call that returns an array of plans,
+and hands each plan back to the coroutine awaiting it. Items the batch
+response does not cover with a valid plan are retried one by one.
+"""
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class IntentBatcher:
+    def __init__(self, call_batch, call_single, window_seconds: float = 0.03, max_batch_size: int = 16,
+                 required_keys: tuple = ()):
+        """
+        call_batch(key, items) -> list of plans aligned with `items` (entries may be None).
+        call_single(key, item) -> plan, used for singletons and per-item fallback.
+        Items are only batched with others that share the same `key` (e.g. grid status).
+        """
+        self.call_batch = call_batch
+        self.call_single = call_single
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.required_keys = required_keys
+        self._pending = {}  # key -> list of (item, future)
+        self._timers = {}   # key -> asyncio.TimerHandle
+        self._tasks = set()
+        self.stats = {"batches": 0, "batched_items": 0, "single_calls": 0, "item_fallbacks": 0}
+
+    async def submit(self, key, item) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window_seconds, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _is_valid(self, plan) -> bool:
+        return isinstance(plan, dict) and all(k in plan for k in self.required_keys)
+
+    async def _run(self, key, batch: list):
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        if len(batch) == 1:
+            await self._run_single(key, *batch[0])
+            return
+
+        self.stats["batches"] += 1
+        self.stats["batched_items"] += len(batch)
+        try:
+            plans = await self.call_batch(key, [item for item, _ in batch])
+        except Exception as e:
+            log.warning("GenAI batch failed; retrying items individually", extra={"fields": {"batch_size": len(batch), "error": str(e)}})
+            plans = []
+
+        retries = []
+        for i, (item, future) in enumerate(batch):
+            plan = plans[i] if i < len(plans) else None
+            if future.done():
+                continue
+            if self._is_valid(plan):
+                future.set_result(plan)
+            else:
+                retries.append(self._run_single(key, item, future))
+        if retries:
+            self.stats["item_fallbacks"] += len(retries)
+            await asyncio.gather(*retries)
+
+    async def _run_single(self, key, item, future):
+        self.stats["single_calls"] += 1
+        try:
+            plan = await self.call_single(key, item)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(plan)
@@ -0,0 +1,141 @@
+"""Grid telemetry ingestion and automatic stress detection.
+
+Telemetry (site load, grid frequency, energy price) arrives in batches and is
+appended to fixed-size NumPy ring buffers. Ingestion is a vectorized copy
+with no per-sample Python work and no allocation once the buffers exist.
+Rolling statistics are computed over a time window when the detector
+evaluates, not when samples arrive.
+
+`StressDetector` turns the rolling means into a stressed/stable state with
+hysteresis:
+
+* It enters STRESSED when any signal crosses its enter threshold.
+* It returns to STABLE only once every signal is back past its (looser) exit
+  threshold.
+* It holds each state for at least `min_dwell_seconds`.
+
+A signal with no samples in the window does not vote.
+"""
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+SIGNALS = ("site_load_kw", "frequency_hz", "price_eur_mwh")
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) buffer; the oldest samples are overwritten."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._times = np.full(capacity, -np.inf)
+        self._values = np.zeros(capacity)
+        self._next = 0
+        self.total = 0  # Samples ever written
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        self.total += len(values)
+        if len(values) > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+        rows = (self._next + np.arange(len(values))) % self.capacity
+        self._times[rows] = times
+        self._values[rows] = values
+        self._next = (self._next + len(values)) % self.capacity
+
+    def since(self, start: float) -> np.ndarray:
+        """Values with a timestamp >= start (in buffer order, not time order)."""
+        return self._values[self._times >= start]
+
+    def latest(self) -> float | None:
+        return float(self._values[self._next - 1]) if self.total else None
+
+
+class Thresholds(NamedTuple):
+    enter: float
+    exit: float
+    above: bool  # True: stressed when the signal is high (load, price); False: when low (frequency)
+
+
+class StressDetector:
+    def __init__(self, thresholds: dict, window_seconds: float = 30.0, min_dwell_seconds: float = 60.0,
+                 capacity: int = 8192):
+        """`thresholds` maps signal name -> Thresholds; signals without thresholds are only recorded."""
+        self.thresholds = thresholds
+        self.window_seconds = window_seconds
+        self.min_dwell_seconds = min_dwell_seconds
+        self.buffers = {name: RingBuffer(capacity) for name in SIGNALS}
+        self.stressed = False
+        self.changed_at = -np.inf
+        self.transitions = 0
+        self.reasons = []
+
+    def ingest(self, columns: dict, now: float | None = None) -> int:
+        """Appends a batch: {"ts": [...] (optional), "<signal>": value or [values], ...}. Returns samples stored."""
+        now = time.time() if now is None else now
+        stored = 0
+        times = columns.get("ts")
+        for name in SIGNALS:
+            if columns.get(name) is None:
+                continue
+            values = np.atleast_1d(np.asarray(columns[name], dtype=float))
+            stamps = np.full(len(values), now) if times is None else np.atleast_1d(np.asarray(times, dtype=float))
+            if len(stamps) != len(values):
+                raise ValueError(f"'{name}' has {len(values)} samples but 'ts' has {len(stamps)}")
+            if not np.isfinite(values).all():
+                raise ValueError(f"'{name}' contains non-finite values")
+            self.buffers[name].extend(stamps, values)
+            stored += len(values)
+        return stored
+
+    def rolling(self, now: float | None = None) -> dict:
+        """{signal: {"mean", "min", "max", "samples"}} over the window; None for signals without samples."""
+        start = (time.time() if now is None else now) - self.window_seconds
+        stats = {}
+        for name, buffer in self.buffers.items():
+            values = buffer.since(start)
+            stats[name] = None if not len(values) else {
+                "mean": float(values.mean()), "min": float(values.min()), "max": float(values.max()), "samples": int(len(values)),
+            }
+        return stats
+
+    def evaluate(self, now: float | None = None) -> bool | None:
+        """Re-derives the state. Returns the new state when it flips, else None."""
+        now = time.time() if now is None else now
+        if now - self.changed_at < self.min_dwell_seconds:
+            return None
+        stats = self.rolling(now)
+        entering, holding = [], []
+        for name, limits in self.thresholds.items():
+            if stats[name] is None:
+                continue
+            mean = stats[name]["mean"]
+            if (mean >= limits.enter) if limits.above else (mean <= limits.enter):
+                entering.append(name)
+            if (mean > limits.exit) if limits.above else (mean < limits.exit):
+                holding.append(name)
+        if not self.stressed and entering:
+            self._flip(True, now, entering)
+            return True
+        if self.stressed and not holding and any(stats[name] for name in self.thresholds):
+            self._flip(False, now, [])
+            return False
+        return None
+
+    def _flip(self, stressed: bool, now: float, reasons: list):
+        self.stressed = stressed
+        self.changed_at = now
+        self.transitions += 1
+        self.reasons = reasons
+
+    def stats(self, now: float | None = None) -> dict:
+        return {
+            "stressed": self.stressed,
+            "reasons": self.reasons,
+            "transitions": self.transitions,
+            "window_seconds": self.window_seconds,
+            "min_dwell_seconds": self.min_dwell_seconds,
+            "samples_total": {name: buffer.total for name, buffer in self.buffers.items()},
+            "rolling": self.rolling(now),
+            "thresholds": {name: limits._asdict() for name, limits in self.thresholds.items()},
+        }
@@ -0,0 +1,67 @@
+"""LRU/TTL cache in front of the GenAI intent call.
+
+Gemini runs with temperature=0.0, so the same request context yields the same
+intent. The cache key is the normalized user text, the SoC guess and a coarse
+time bucket (the prompt embeds the current time, which affects relative
+deadlines such as "flight in 2 hours"). The grid status is not part of it: the
+model no longer sees it, and the plan is applied by the policy after lookup.
+Fields listed in `volatile_fields` are not served from the cache.
+"""
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+_NON_WORD = re.compile(r"[^\w%]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases and drops punctuation/extra whitespace ("Battery is DEAD!!" == "battery is dead")."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class IntentCache:
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 900, bucket_minutes: int = 15,
+                 volatile_fields: tuple = ()):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.bucket_seconds = bucket_minutes * 60
+        self.volatile_fields = volatile_fields
+        self._entries = OrderedDict()  # key -> (expires_at, plan)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, text: str, soc_guess: int, now: datetime) -> tuple:
+        return (normalize_text(text), soc_guess, int(now.timestamp() // self.bucket_seconds))
+
+    def get(self, key) -> dict | None:
+        """Returns a copy of the cached plan (without volatile fields), or None."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, key, plan: dict):
+        cached = {k: v for k, v in plan.items() if k not in self.volatile_fields}
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,69 @@
+"""Latency budgets and hedged requests for the intent stage.
+
+* `Deadline` tracks the end-to-end budget of one /api/negotiate call.
+* `LatencyTracker` keeps a window of recent model latencies and yields the
+  percentile after which a request counts as "slow".
+* `hedged()` starts a second, independent attempt once the first one has been
+  running longer than that threshold and returns whichever succeeds first.
+"""
+import asyncio
+import time
+from collections import deque
+
+
+class Deadline:
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class LatencyTracker:
+    def __init__(self, sample_size: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=sample_size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        """The `percent`-th percentile of recent samples, or None until enough samples exist."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+async def hedged(primary, hedge, hedge_after: float | None, on_hedge=None, is_failure=None):
+    """Awaits `primary()`; if it is still running after `hedge_after` seconds, also starts `hedge()`.
+
+    Returns the first successful result and cancels the other attempt. A result
+    for which `is_failure(result)` is true (e.g. a fallback plan) counts as a
+    failure, so a hedge that fails fast cannot beat a slower primary. If every
+    attempt fails, the primary's result is returned or its error raised.
+    `hedge_after=None` disables hedging.
+    """
+    tasks = [asyncio.ensure_future(primary())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                if on_hedge is not None:
+                    on_hedge()
+                tasks.append(asyncio.ensure_future(hedge()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and not (is_failure is not None and is_failure(task.result())):
+                    return task.result()
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,167 @@
+"""Open-loop load generator for the orchestrator, built on simulate_demo.py.
+
+Synthetic drivers (the demo USERS plus templated texts with random SoCs and
+deadlines) hit /api/negotiate at a target Poisson arrival rate for a fixed
+duration, while dashboards poll /api/status at their own rate. Requests are
+fired on schedule whether or not earlier ones have finished (open loop), so
+queueing inside the orchestrator shows up as latency instead of silently
+lowering the offered load.
+
+    python3 load_test.py --rate 20 --duration 60 --status-rate 5 --output results/run.json
+
+Pair it with fake_genai_server.py to benchmark without spending API quota.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+from simulate_demo import ORCHESTRATOR_URL, USERS
+
+TEXT_TEMPLATES = [
+    "My battery is dead, please help!",
+    "I'm at {soc}% and I need {target}% before {hour} PM.",
+    "Just plugging in at {soc}%. I'll be here all day, no rush.",
+    "I'M IN A PANIC! Only {soc}% left and I have a flight to catch.",
+    "Car is at {soc}%, need a full charge by tomorrow morning.",
+    "Not sure how long I'll stay, maybe an hour? Battery around {soc}%.",
+    "Need {target}% for a long drive, leaving at {hour} PM. Currently {soc}%.",
+    "Whenever is fine, I'm flexible. SoC is {soc}%.",
+]
+
+
+def synthetic_driver(rng: random.Random, run_id: str, n: int) -> dict:
+    if rng.random() < 0.1:
+        return {**rng.choice(USERS), "user_did": f"did:denso:user:load{run_id}:{n}"}
+    text = rng.choice(TEXT_TEMPLATES).format(soc=rng.randint(2, 85), target=rng.choice([60, 70, 80, 90, 100]), hour=rng.randint(1, 9))
+    # A small pool of drivers re-negotiates repeatedly, like real chargers being re-plugged.
+    driver = rng.randint(0, 999) if rng.random() < 0.3 else n
+    return {"user_did": f"did:denso:user:load{run_id}:{driver}", "text": text}
+
+
+def percentile(sorted_values: list, percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    latencies = sorted(s["latency_ms"] for s in samples if s["ok"])
+    by_status = {}
+    for s in samples:
+        by_status[str(s["status"])] = by_status.get(str(s["status"]), 0) + 1
+    return {
+        "sent": len(samples),
+        "ok": len(latencies),
+        "errors": len(samples) - len(latencies),
+        "by_status": by_status,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        },
+    }
+
+
+async def timed_call(client: httpx.AsyncClient, method: str, url: str, samples: list, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+        ok = response.is_success or status == 304
+    except Exception as e:
+        status, ok = type(e).__name__, False
+    samples.append({"status": status, "ok": ok, "latency_ms": (time.perf_counter() - started) * 1000})
+
+
+async def open_loop(rate: float, duration: float, rng: random.Random, fire):
+    """Calls fire(n) at Poisson arrival times without waiting for earlier calls to finish."""
+    tasks = []
+    if rate <= 0:
+        return tasks
+    start = time.perf_counter()
+    next_at, n = rng.expovariate(rate), 0
+    while next_at < duration:
+        delay = start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(n)))
+        n += 1
+        next_at += rng.expovariate(rate)
+    return tasks
+
+
+async def run(args) -> dict:
+    # Arrivals, status polls and driver texts each get their own stream, so a seed reproduces the same run.
+    arrival_rng, driver_rng = random.Random(args.seed), random.Random(args.seed + 2)
+    started_at = datetime.now()
+    run_id = started_at.strftime("%H%M%S")
+    negotiate_samples, status_samples = [], []
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        def negotiate(n: int):
+            # Drawn here, in arrival order, rather than inside the task, where scheduling would decide the order.
+            driver = synthetic_driver(driver_rng, run_id, n)
+            return timed_call(client, "POST", "/api/negotiate", negotiate_samples, json=driver)
+
+        async def poll_status(n: int):
+            await timed_call(client, "GET", "/api/status", status_samples)
+
+        print(f"--- Load test: {args.rate}/s negotiate, {args.status_rate}/s status for {args.duration}s against {args.url} ---")
+        started = time.perf_counter()
+        negotiate_tasks, status_tasks = await asyncio.gather(
+            open_loop(args.rate, args.duration, arrival_rng, negotiate),
+            open_loop(args.status_rate, args.duration, random.Random(args.seed + 1), poll_status),
+        )
+        await asyncio.gather(*negotiate_tasks, *status_tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "label": args.label,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {
+            "/api/negotiate": summarize(negotiate_samples, elapsed),
+            "/api/status": summarize(status_samples, elapsed),
+        },
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{'endpoint':<16}{'sent':>7}{'ok':>7}{'err':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for endpoint, stats in report["endpoints"].items():
+        lat = stats["latency_ms"]
+        print(f"{endpoint:<16}{stats['sent']:>7}{stats['ok']:>7}{stats['errors']:>6}{stats['throughput_rps']:>9}"
+              f"{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}{lat['max']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the Charge Consensus orchestrator.")
+    parser.add_argument("--url", default=ORCHESTRATOR_URL)
+    parser.add_argument("--rate", type=float, default=10.0, help="Mean /api/negotiate arrivals per second (Poisson)")
+    parser.add_argument("--status-rate", type=float, default=2.0, help="Mean /api/status polls per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="", help="Free-form tag stored with the results (e.g. a release)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
@@ -2,22 +2,42 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-from fastapi import FastAPI, Request, HTTPException
+import logging
+from fastapi import FastAPI, Request, HTTPException, Header
 from starlette.responses import HTMLResponse
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-import httpx
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+import math
 import time
 import json 
 import asyncio 
 import random
-import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from google import genai
-from google.genai.types import GenerateContentConfig, Schema, Type
+from google.genai.types import HttpOptions
+
+from charge_queue import ChargeQueue
+from credential_store import CredentialStore
+from persistence import DurableStore
+from state_backend import MemoryBackend, SQLiteSharedBackend
+from scheduler import DEFAULT_MIN_SOC, DEFAULT_START_SOC, ChargerScheduler, energy_needed_kwh, parse_topology
+from power_allocation import PowerAllocator
+from charge_time import ChargeTimeModel
+from grid_signals import StressDetector, Thresholds
+from status_stream import RESYNC, StatusBroadcaster, format_sse
+from intent_cache import IntentCache
+from charging_plan import ChargingPolicy, replan_queue
+from fast_intent import extract_fast_intent, guess_start_soc
+from genai_batcher import IntentBatcher
+from admission import AdmissionController, AdmissionRejected
+from latency_budget import Deadline, LatencyTracker, hedged
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, RequestMetricsMiddleware
+from structured_log import RequestIdMiddleware, setup_logging
+from prompts import (BATCH_INTENT_CONFIG, BATCH_INTENT_PROMPT, INTENT_REQUIRED_KEYS, SINGLE_INTENT_CONFIG,
+                     SINGLE_INTENT_PROMPT, RecentDecisions, build_batch_prompt, build_intent_prompt)
 
 # --- Main Application Setup ---
 app = FastAPI(
@@ -27,18 +47,150 @@ app = FastAPI(
 )
 
 # --- Configuration & Global State ---
+LOG_HANDLER = setup_logging(
+    level=os.environ.get('LOG_LEVEL', "INFO"),
+    debug_sample_rate=float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1)),
+    queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+)
+log = logging.getLogger("orchestrator")
 DENSO_API_HOST = "https://hackathon1.didgateway.eu"
 # IMPORTANT: Replace with your actual Google AI API key
 GEMINI_API_KEY_VALUE = os.environ.get('GEMINI_API_KEY')
-genai_client = genai.Client(api_key=GEMINI_API_KEY_VALUE)
-if not GEMINI_API_KEY_VALUE:
-    print("[ERROR] GEMINI_API_KEY not loaded. Please check your .env file or environment variables.")
+GENAI_MODEL = os.environ.get('GENAI_MODEL', "gemini-2.5-flash")
+# Set GENAI_BASE_URL to point at a local stand-in (see fake_genai_server.py) for offline load tests.
+GENAI_BASE_URL = os.environ.get('GENAI_BASE_URL')
+if GENAI_BASE_URL:
+    genai_client = genai.Client(api_key=GEMINI_API_KEY_VALUE or "fake-key", http_options=HttpOptions(base_url=GENAI_BASE_URL))
+    print(f"[INFO] Using GenAI backend at {GENAI_BASE_URL}.")
 else:
+    genai_client = genai.Client(api_key=GEMINI_API_KEY_VALUE)
+if not GEMINI_API_KEY_VALUE and not GENAI_BASE_URL:
+    print("[ERROR] GEMINI_API_KEY not loaded. Please check your .env file or environment variables.")
+elif GEMINI_API_KEY_VALUE:
     print("[INFO] GEMINI_API_KEY successfully loaded.")
 
-GRID_IS_STRESSED = False
-CHARGE_REQUEST_QUEUE = []
-USER_VCS = {} 
+CHARGE_REQUEST_QUEUE = ChargeQueue()
+USER_VCS = CredentialStore(
+    max_size=int(os.environ.get('VC_STORE_MAX_SIZE', 100_000)),
+    ttl_seconds=float(os.environ.get('VC_TTL_SECONDS', 86_400)),
+)
+STATUS_BROADCASTER = StatusBroadcaster()
+STREAM_KEEPALIVE_SECONDS = 15
+# "<count>x<kW>" groups, e.g. "8x22,2x150". The default matches the original four-charger site.
+CHARGER_TOPOLOGY = os.environ.get('CHARGER_TOPOLOGY', "4x22")
+VEHICLE_BATTERY_KWH = float(os.environ.get('VEHICLE_BATTERY_KWH', 60))
+SCHEDULER = ChargerScheduler(parse_topology(CHARGER_TOPOLOGY))
+CHARGER_POWER_KW = {charger.charger_id: charger.power_kw for charger in SCHEDULER.chargers}
+# The site cap is shared by the sessions on a charger every POWER_STEP_SECONDS; a stressed grid scales it down.
+SITE_POWER_CAP_KW = float(os.environ.get('SITE_POWER_CAP_KW', 0.75 * sum(CHARGER_POWER_KW.values())))
+GRID_STRESSED_POWER_FACTOR = float(os.environ.get('GRID_STRESSED_POWER_FACTOR', 0.5))
+POWER_STEP_SECONDS = float(os.environ.get('POWER_STEP_SECONDS', 1.0))  # 0 disables the allocation loop
+# The charger plan is re-made from the energy actually delivered at least every SCHEDULE_ADVANCE_SECONDS, and after
+# sessions finish (at most every SCHEDULE_MIN_ADVANCE_SECONDS: a re-plan replays the whole queue).
+SCHEDULE_ADVANCE_SECONDS = float(os.environ.get('SCHEDULE_ADVANCE_SECONDS', 60))
+SCHEDULE_MIN_ADVANCE_SECONDS = float(os.environ.get('SCHEDULE_MIN_ADVANCE_SECONDS', 5))
+# Pickup times are estimated from the planned slot, the allocated power and the vehicle's charge taper.
+CHARGE_TIME = ChargeTimeModel(
+    vehicle_max_kw=float(os.environ.get('VEHICLE_MAX_CHARGE_KW', 150)),
+    efficiency=float(os.environ.get('CHARGE_EFFICIENCY', 0.92)),
+)
+POWER = PowerAllocator(battery_kwh=VEHICLE_BATTERY_KWH, charge_model=CHARGE_TIME)
+# Telemetry posted to /api/grid/telemetry drives the grid flag; thresholds are (enter, exit) pairs.
+GRID_EVAL_SECONDS = float(os.environ.get('GRID_EVAL_SECONDS', 1.0))  # 0 disables automatic stress detection
+GRID_DETECTOR = StressDetector(
+    {
+        "site_load_kw": Thresholds(float(os.environ.get('GRID_LOAD_ENTER_KW', SITE_POWER_CAP_KW)),
+                                   float(os.environ.get('GRID_LOAD_EXIT_KW', 0.85 * SITE_POWER_CAP_KW)), above=True),
+        "frequency_hz": Thresholds(float(os.environ.get('GRID_FREQ_ENTER_HZ', 49.85)),
+                                   float(os.environ.get('GRID_FREQ_EXIT_HZ', 49.95)), above=False),
+        "price_eur_mwh": Thresholds(float(os.environ.get('GRID_PRICE_ENTER_EUR_MWH', 250)),
+                                    float(os.environ.get('GRID_PRICE_EXIT_EUR_MWH', 180)), above=True),
+    },
+    window_seconds=float(os.environ.get('GRID_SIGNAL_WINDOW_SECONDS', 30)),
+    min_dwell_seconds=float(os.environ.get('GRID_MIN_DWELL_SECONDS', 60)),
+    capacity=int(os.environ.get('GRID_SIGNAL_BUFFER_SIZE', 8192)),
+)
+# Charging option, points and pickup time come from this rule table, re-read when the file changes.
+POLICY = ChargingPolicy(os.environ.get('CHARGING_POLICY_PATH', "policy.json"))
+POLICY_RELOAD_SECONDS = float(os.environ.get('POLICY_RELOAD_SECONDS', 2.0))  # 0 disables hot reload
+INTENT_CACHE = IntentCache(
+    max_size=int(os.environ.get('INTENT_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('INTENT_CACHE_TTL_SECONDS', 900)),
+    bucket_minutes=int(os.environ.get('INTENT_CACHE_BUCKET_MINUTES', 15)),
+)
+# Pre-rendered short-term memory for the prompt: the last few queued decisions, updated on every enqueue.
+RECENT_DECISIONS = RecentDecisions(int(os.environ.get('PROMPT_MEMORY_SIZE', 2)))
+FAST_PATH_MIN_CONFIDENCE = float(os.environ.get('FAST_PATH_MIN_CONFIDENCE', 0.8))
+INTENT_STATS = {"requests": 0, "fast_path": 0, "cache": 0, "genai": 0, "fallbacks": 0, "hedged": 0, "hedges_skipped": 0,
+                "budget_exhausted": 0}
+GENAI_BATCH_WINDOW_MS = float(os.environ.get('GENAI_BATCH_WINDOW_MS', 30))  # 0 disables micro-batching
+GENAI_BATCH_MAX_SIZE = int(os.environ.get('GENAI_BATCH_MAX_SIZE', 16))
+GENAI_ADMISSION = AdmissionController(
+    max_in_flight=int(os.environ.get('GENAI_MAX_IN_FLIGHT', 32)),
+    max_waiting=int(os.environ.get('GENAI_MAX_WAITING', 64)),
+    max_wait_seconds=float(os.environ.get('GENAI_MAX_QUEUE_WAIT_MS', 2000)) / 1000,
+)
+NEGOTIATE_BUDGET_MS = float(os.environ.get('NEGOTIATE_BUDGET_MS', 8000))
+GENAI_HEDGE_PERCENTILE = float(os.environ.get('GENAI_HEDGE_PERCENTILE', 95))  # 0 disables hedging
+GENAI_HEDGE_MIN_DELAY_MS = float(os.environ.get('GENAI_HEDGE_MIN_DELAY_MS', 250))
+GENAI_LATENCY = LatencyTracker()
+# STATE_BACKEND=memory keeps state in this process. Setting CHARGE_DB_PATH mirrors it to SQLite
+# and restores it on startup. STATE_BACKEND=sqlite shares it between worker processes (see serve.py).
+STATE_BACKEND = os.environ.get('STATE_BACKEND', "memory")
+CHARGE_DB_PATH = os.environ.get('CHARGE_DB_PATH') or ("charge_state.db" if STATE_BACKEND == "sqlite" else None)
+CHARGE_DB_SYNCHRONOUS = os.environ.get('CHARGE_DB_SYNCHRONOUS', "NORMAL")
+DURABLE_STORE = DurableStore(
+    CHARGE_DB_PATH,
+    batch_size=int(os.environ.get('CHARGE_DB_BATCH_SIZE', 512)),
+    synchronous=CHARGE_DB_SYNCHRONOUS,
+) if CHARGE_DB_PATH and STATE_BACKEND == "memory" else None
+STATE_SYNC_INTERVAL_MS = float(os.environ.get('STATE_SYNC_INTERVAL_MS', 50))  # How often workers pick up each other's changes
+# With shared state, one worker (the lease holder) applies the grid flips derived from telemetry.
+LEADER_LEASE_SECONDS = float(os.environ.get('LEADER_LEASE_SECONDS', 10))
+
+# --- Metrics (Prometheus text format at /metrics) ---
+METRICS = Registry()
+HTTP_REQUEST_SECONDS = METRICS.histogram("charge_http_request_seconds", "Time until response start, by endpoint and status.", ("handler", "status"))
+NEGOTIATE_STAGE_SECONDS = METRICS.histogram("charge_negotiate_stage_seconds", "Time spent in each stage of /api/negotiate.", ("stage",))
+GENAI_CALL_SECONDS = METRICS.histogram("charge_genai_call_seconds", "Latency of individual Gemini calls.", ("call", "outcome"))
+GENAI_PROMPT_CHARS = METRICS.histogram("charge_genai_prompt_chars", "Size of prompts sent to Gemini, in characters.", ("call",),
+                                       buckets=(500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000))
+GENAI_ADMISSION_WAIT_SECONDS = METRICS.histogram("charge_genai_admission_wait_seconds", "Queueing delay before entering the GenAI stage.")
+NEGOTIATE_ERRORS = METRICS.counter("charge_negotiate_errors_total", "Failed /api/negotiate calls by reason.", ("reason",))
+METRICS.counter("charge_intent_resolutions_total", "Resolved intents by source.", ("source",),
+                callback=lambda: {(source,): INTENT_STATS[source] for source in ("fast_path", "cache", "genai")})
+METRICS.counter("charge_intent_fallbacks_total", "Plans not produced by the model or the fast path.", ("reason",),
+                callback=lambda: {("genai_error",): INTENT_STATS["fallbacks"], ("budget_exhausted",): INTENT_STATS["budget_exhausted"]})
+METRICS.counter("charge_intent_cache_hits_total", "Intent cache hits.", callback=lambda: INTENT_CACHE.hits)
+METRICS.counter("charge_intent_cache_misses_total", "Intent cache misses.", callback=lambda: INTENT_CACHE.misses)
+METRICS.counter("charge_genai_hedged_total", "Hedged second Gemini requests sent.", callback=lambda: INTENT_STATS["hedged"])
+METRICS.counter("charge_genai_batches_total", "Micro-batched Gemini calls sent.", callback=lambda: INTENT_BATCHER.stats["batches"])
+METRICS.counter("charge_genai_admission_rejections_total", "Requests shed by GenAI admission control.", ("reason",),
+                callback=lambda: {("queue_full",): GENAI_ADMISSION.rejected_queue_full, ("wait_timeout",): GENAI_ADMISSION.rejected_timeout})
+METRICS.gauge("charge_queue_depth", "Queued charge requests by priority.", ("priority",),
+              callback=lambda: {(priority,): count for priority, count in {"high": 0, "medium": 0, "low": 0, **CHARGE_REQUEST_QUEUE.counts_by_priority()}.items()})
+METRICS.gauge("charge_grid_stressed", "1 while the grid is STRESSED, 0 while STABLE.", callback=lambda: int(STATE.grid_stressed))
+METRICS.gauge("charge_genai_in_flight", "Negotiations inside the GenAI stage.", callback=lambda: GENAI_ADMISSION.in_flight)
+POWER_STEP_DURATION_SECONDS = METRICS.histogram("charge_power_step_seconds", "Time to compute one power allocation step.",
+                                                buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+REPLAN_DURATION_SECONDS = METRICS.histogram("charge_replan_seconds", "Time to re-plan the whole queue after a grid flip or policy change.",
+                                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+METRICS.gauge("charge_site_power_cap_kw", "Site power cap for the current step.", callback=lambda: POWER.cap_kw)
+METRICS.gauge("charge_site_power_allocated_kw", "Power allocated to charging sessions in the current step.",
+              callback=lambda: POWER.stats()["allocated_kw"])
+METRICS.counter("charge_grid_samples_total", "Grid telemetry samples ingested by signal.", ("signal",),
+                callback=lambda: {(name,): buffer.total for name, buffer in GRID_DETECTOR.buffers.items()})
+METRICS.counter("charge_grid_auto_transitions_total", "Grid state flips made by the stress detector.", callback=lambda: GRID_DETECTOR.transitions)
+METRICS.gauge("charge_genai_waiting", "Negotiations waiting for GenAI admission.", callback=lambda: GENAI_ADMISSION.waiting)
+METRICS.gauge("charge_status_stream_subscribers", "Open /api/status/stream connections.", callback=lambda: STATUS_BROADCASTER.subscriber_count)
+METRICS.gauge("charge_vc_store_size", "Valid credentials held in the VC store.", callback=lambda: len(USER_VCS))
+METRICS.counter("charge_vc_store_removals_total", "Credentials dropped from the VC store by reason.", ("reason",),
+                callback=lambda: {("evicted",): USER_VCS.evictions, ("expired",): USER_VCS.expirations})
+METRICS.gauge("charge_db_pending_writes", "Writes queued for the SQLite store but not yet committed.",
+              callback=lambda: DURABLE_STORE.stats()["pending"] if DURABLE_STORE else 0)
+METRICS.counter("charge_db_commits_total", "Group commits to the SQLite store.", callback=lambda: DURABLE_STORE.commits if DURABLE_STORE else 0)
+METRICS.counter("charge_log_records_dropped_total", "Log records dropped because the log writer fell behind.", callback=lambda: LOG_HANDLER.dropped)
+GENAI_ADMISSION.on_wait = GENAI_ADMISSION_WAIT_SECONDS.observe
 
 # --- CORS Middleware ---
 app.add_middleware(
@@ -48,6 +200,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware, histogram=HTTP_REQUEST_SECONDS)
+app.add_middleware(RequestIdMiddleware)
 
 # --- API Data Models ---
 class UserNegotiateRequest(BaseModel):
@@ -60,6 +214,268 @@ class InternalChargeRequest(BaseModel):
     charging_option: str | None = None; points_awarded: int = 0
     pickup_time: str | None = None; is_grid_stressed_at_request: bool = False
 
+# --- State Backend ---
+def on_state_change(event: str, data):
+    """Fans out every change to the local views, whether made by this worker or another one."""
+    if event == "telemetry":  # Samples another worker received; every detector sees the whole stream
+        GRID_DETECTOR.ingest(data["columns"], now=data["received_at"])
+        return
+    if event in ("grid", "resync"):
+        replan = replan_for_grid()
+    if event == "grid":
+        # One event carries both the flag and every re-planned entry, so dashboards never see a half-applied flip.
+        data = {**data, "replan": replan}
+        log.info("Queue re-planned", extra={"fields": {
+            "is_grid_stressed": data["is_grid_stressed"], "changed": sum(len(group["user_dids"]) for group in replan)}})
+    if event == "upsert":
+        track_session(data)
+        RECENT_DECISIONS.record(data)
+    elif event == "remove":
+        SCHEDULER.remove(data["user_did"])
+        POWER.remove(data["user_did"])
+        if RECENT_DECISIONS.discard(data["user_did"]):
+            rebuild_recent_decisions()  # Backfill the next most recent request
+    if event == "resync":
+        rebuild_sessions()
+        rebuild_recent_decisions()
+        STATUS_BROADCASTER.resync_all()
+    else:
+        STATUS_BROADCASTER.publish(event, data)
+
+def rebuild_recent_decisions():
+    """Refills the prompt memory from the newest queued requests; latest() only walks those."""
+    RECENT_DECISIONS.clear()
+    for queued in CHARGE_REQUEST_QUEUE.latest(RECENT_DECISIONS.size + 1):
+        RECENT_DECISIONS.record(queued.model_dump())
+
+def track_session(request: dict):
+    """Feeds a queued request (as a dict) to the charger scheduler and the power allocator."""
+    SCHEDULER.upsert_request(request, VEHICLE_BATTERY_KWH)
+    POWER.upsert(request["user_did"], request["priority"], SCHEDULER.deadline_of(request["user_did"]),
+                 energy_needed_kwh(request.get("start_soc"), request.get("min_soc"), VEHICLE_BATTERY_KWH),
+                 DEFAULT_MIN_SOC if request.get("min_soc") is None else request["min_soc"])
+
+def replan_for_grid() -> list[dict]:
+    """Re-plans every queued request for the current grid state (no model calls); see charging_plan.replan_queue."""
+    changed_at = datetime.fromtimestamp(STATE.grid_changed_at) if STATE.grid_changed_at else datetime.now()
+    POWER.reset_pickups()  # The next power step puts the estimated pickup times back
+    with REPLAN_DURATION_SECONDS.time():
+        return replan_queue(CHARGE_REQUEST_QUEUE, POLICY, STATE.grid_stressed, changed_at)
+
+def rebuild_sessions():
+    SCHEDULER.clear()
+    POWER.clear()
+    for request in CHARGE_REQUEST_QUEUE:
+        track_session(request.model_dump())
+
+if STATE_BACKEND == "sqlite":
+    STATE = SQLiteSharedBackend(CHARGE_REQUEST_QUEUE, USER_VCS, InternalChargeRequest.model_construct, CHARGE_DB_PATH,
+                                on_change=on_state_change, synchronous=CHARGE_DB_SYNCHRONOUS)
+else:
+    # Rows are validated before they are stored, so they are rebuilt with model_construct to keep recovery fast.
+    STATE = MemoryBackend(CHARGE_REQUEST_QUEUE, USER_VCS, InternalChargeRequest.model_construct,
+                          on_change=on_state_change, durable=DURABLE_STORE)
+
+# --- Queue Service (shared by /api/negotiate and /api/charge_request) ---
+async def enqueue_charge_request(charge_request: InternalChargeRequest):
+    """Adds or replaces a user's request in the charging queue (one entry per user)."""
+    await STATE.upsert_request(charge_request)
+
+async def remove_charge_request(user_did: str) -> InternalChargeRequest | None:
+    """Removes a user's request from the charging queue, if present."""
+    return await STATE.remove_request(user_did)
+
+# --- Grid Service ---
+async def set_grid_stressed(stressed: bool):
+    """Sets the grid flag; subscribers hear about it (and the queue is re-planned) only when it actually flips.
+
+    The intent cache is left alone: the grid status is not part of the cached intent.
+    """
+    await STATE.set_grid_stressed(stressed)
+
+# --- State Lifecycle ---
+_BACKGROUND_LOOPS = []
+
+@app.on_event("startup")
+async def start_state_backend():
+    """Loads state before serving and, for a shared backend, keeps following other workers' changes."""
+    started = time.perf_counter()
+    STATE.load()
+    replan_for_grid()
+    rebuild_sessions()
+    rebuild_recent_decisions()
+    log.info("State loaded", extra={"fields": {
+        "backend": STATE_BACKEND, "path": CHARGE_DB_PATH, "queued": len(CHARGE_REQUEST_QUEUE), "credentials": len(USER_VCS),
+        "is_grid_stressed": STATE.grid_stressed, "seconds": round(time.perf_counter() - started, 3)}})
+    if STATE_BACKEND == "sqlite":
+        await STATE.renew_leadership(LEADER_LEASE_SECONDS)
+        _BACKGROUND_LOOPS.append(asyncio.create_task(hold_leadership()))
+    if STATE_BACKEND == "sqlite" and STATE_SYNC_INTERVAL_MS > 0:
+        _BACKGROUND_LOOPS.append(asyncio.create_task(follow_shared_state()))
+    if POWER_STEP_SECONDS > 0:
+        _BACKGROUND_LOOPS.append(asyncio.create_task(run_power_allocation()))
+    if GRID_EVAL_SECONDS > 0:
+        _BACKGROUND_LOOPS.append(asyncio.create_task(run_grid_detection()))
+    if POLICY_RELOAD_SECONDS > 0 and POLICY.path:
+        _BACKGROUND_LOOPS.append(asyncio.create_task(watch_policy()))
+
+async def follow_shared_state():
+    while True:
+        await asyncio.sleep(STATE_SYNC_INTERVAL_MS / 1000)
+        try:
+            STATE.sync()
+        except Exception as e:
+            log.warning("State sync failed", extra={"fields": {"error": str(e)}})
+
+async def hold_leadership():
+    """Renews the leader lease well before it expires, or takes it over from a worker that stopped renewing."""
+    while True:
+        await asyncio.sleep(LEADER_LEASE_SECONDS / 3)
+        was_leader = STATE.is_leader
+        try:
+            await STATE.renew_leadership(LEADER_LEASE_SECONDS)
+        except Exception as e:
+            STATE.is_leader = False  # Another worker takes over once our lease runs out
+            log.warning("Leader lease renewal failed", extra={"fields": {"error": str(e)}})
+        if STATE.is_leader != was_leader:
+            log.info("Leadership changed", extra={"fields": {"is_leader": STATE.is_leader}})
+            if STATE.is_leader:
+                POWER.reset_pickups()  # The previous leader's estimates are replaced with a full set of ours
+
+# --- Policy Reload ---
+async def watch_policy():
+    """Picks up edits to the policy file and re-plans the queue under the new rules."""
+    while True:
+        await asyncio.sleep(POLICY_RELOAD_SECONDS)
+        try:
+            if not POLICY.reload():
+                continue
+        except Exception as e:  # Any failure must leave the watcher running
+            log.warning("Policy reload failed; keeping previous rules", extra={"fields": {"path": POLICY.path, "error": repr(e)}})
+            continue
+        try:
+            POWER.reset_pickups()
+            with REPLAN_DURATION_SECONDS.time():
+                replan = replan_queue(CHARGE_REQUEST_QUEUE, POLICY, STATE.grid_stressed, datetime.now())
+        except Exception:
+            log.error("Re-plan after policy reload failed", exc_info=True, extra={"fields": {"version": POLICY.version}})
+            continue
+        log.info("Policy reloaded", extra={"fields": {
+            "version": POLICY.version, "changed": sum(len(group["user_dids"]) for group in replan)}})
+        STATUS_BROADCASTER.publish("policy", {"version": POLICY.version, "replan": replan})
+
+# --- Power Allocation Loop ---
+def site_power_cap_kw() -> float:
+    return SITE_POWER_CAP_KW * (GRID_STRESSED_POWER_FACTOR if STATE.grid_stressed else 1.0)
+
+def site_cap_share() -> float:
+    """Share of a charger's power a session can expect while the site cap binds."""
+    return min(site_power_cap_kw() / sum(CHARGER_POWER_KW.values()), 1.0)
+
+async def run_power_allocation():
+    """Re-divides the site cap among charging sessions every POWER_STEP_SECONDS."""
+    schedule_version, completed = None, POWER.completed
+    last_step = advanced_at = time.time()
+    while True:
+        await asyncio.sleep(POWER_STEP_SECONDS)
+        now = time.time()
+        with POWER_STEP_DURATION_SECONDS.time():
+            since_advance = now - advanced_at
+            if since_advance >= SCHEDULE_ADVANCE_SECONDS or (POWER.completed != completed and since_advance >= SCHEDULE_MIN_ADVANCE_SECONDS):
+                # Finished sessions stop holding charger time and the rest are planned from what they still need.
+                completed, advanced_at = POWER.completed, now
+                SCHEDULER.advance(now, POWER.remaining_kwh())
+            if SCHEDULER.version != schedule_version:
+                schedule_version = SCHEDULER.version
+                POWER.set_plan([(user_did, slot.start_minutes, CHARGER_POWER_KW[slot.charger_id], slot.charger_id)
+                                for user_did, slot in SCHEDULER.plan()], SCHEDULER.epoch)
+            POWER.step(site_power_cap_kw(), now, now - last_step)
+        last_step = now
+        if STATE.is_leader:
+            await refresh_pickup_times(now)
+
+async def refresh_pickup_times(now: float):
+    """Re-estimates every session's pickup time in one vectorized pass and stores the ones that moved.
+
+    Only the leader runs this. The times reach every worker's queue, and their dashboards, as one "pickup" change.
+    """
+    changes = {user_did: time.strftime("%H:%M", time.localtime(pickup_at))
+               for user_did, pickup_at in POWER.pickup_changes(now, site_cap_share())}
+    if not changes:
+        return
+    try:
+        await STATE.set_pickup_times(changes)
+    except Exception as e:
+        POWER.reset_pickups()  # Nothing was stored, so the next step sends every estimate again
+        log.warning("Storing pickup times failed", extra={"fields": {"sessions": len(changes), "error": str(e)}})
+
+def estimate_pickup_time(user_did: str) -> str | None:
+    """Pickup estimate for a negotiation's response, from the request's planned slot.
+
+    The queued request keeps its pickup time until the leader's next power step stores one for every worker.
+    """
+    request, slot = CHARGE_REQUEST_QUEUE.get(user_did), SCHEDULER.slot_for(user_did)
+    if request is None or slot is None:
+        return None
+    wait = max(slot.start_minutes - (time.time() - SCHEDULER.epoch) / 60, 0.0)
+    minutes = wait + float(CHARGE_TIME.minutes(
+        DEFAULT_START_SOC if request.start_soc is None else request.start_soc,
+        DEFAULT_MIN_SOC if request.min_soc is None else request.min_soc,
+        CHARGER_POWER_KW[slot.charger_id] * site_cap_share(), VEHICLE_BATTERY_KWH))
+    if not math.isfinite(minutes):
+        return None
+    return time.strftime("%H:%M", time.localtime(time.time() + minutes * 60))
+
+# --- Grid Stress Detection Loop ---
+async def run_grid_detection():
+    """Re-derives the grid state from rolling telemetry. Only flips are applied, so a manual
+    stress/stabilize call holds until the telemetry itself changes state.
+
+    Every worker ingests all telemetry and evaluates, so a new leader takes over with the same
+    detector state, but only the leader applies flips to the shared flag.
+    """
+    while True:
+        await asyncio.sleep(GRID_EVAL_SECONDS)
+        flipped = GRID_DETECTOR.evaluate()
+        if flipped is not None and STATE.is_leader:
+            log.info("Grid state derived from telemetry", extra={"fields": {"is_grid_stressed": flipped, "reasons": GRID_DETECTOR.reasons}})
+            await set_grid_stressed(flipped)
+
+@app.on_event("shutdown")
+def stop_state_backend():
+    for task in _BACKGROUND_LOOPS:
+        task.cancel()
+    STATE.close()
+
+# --- Status Snapshot Cache ---
+# The /api/status payload only changes when the queue or the grid flag changes, so it is
+# serialized once per backend status token and the same bytes are served to every poller.
+_STATUS_SNAPSHOT = {"etag": None, "body": b""}
+
+def build_status_snapshot() -> tuple[str, bytes]:
+    """Returns (etag, serialized payload) for the current queue and grid state."""
+    # The body only holds state every worker shares: the backend's change log, which carries the leader's
+    # pickup times, and the policy in force. The same ETag therefore means the same bytes on any worker.
+    # Charger slots are planned by each worker and move with time, so they are served by /api/schedule.
+    etag = f'"{STATE.status_token()}-{POLICY.digest}"'
+    if _STATUS_SNAPSHOT["etag"] != etag:
+        payload = {
+            "charger_count": len(SCHEDULER.chargers),  # How many are in use at the moment is in /api/schedule
+            "is_grid_stressed": STATE.grid_stressed,
+            "priority_queue": [request.model_dump() for request in CHARGE_REQUEST_QUEUE],
+        }
+        _STATUS_SNAPSHOT.update(
+            etag=etag,
+            body=json.dumps(payload).encode("utf-8"),
+        )
+    return _STATUS_SNAPSHOT["etag"], _STATUS_SNAPSHOT["body"]
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 # --- HTML Dashboard Endpoint ---
 @app.get("/", response_class=HTMLResponse, summary="Serves the main HTML dashboard")
 async def get_dashboard():
@@ -68,56 +484,92 @@ async def get_dashboard():
     except FileNotFoundError: return HTMLResponse(content="<h1>Error: dashboard.html not found.</h1>", status_code=404)
 
 # --- Denso VC Helper Functions (Simulated for speed) ---
-async def issue_or_update_vc(user_did: str, soc: int):
-    if user_did in USER_VCS: print(f"[VC Logic] Updating VC for {user_did}...")
-    else: print(f"[VC Logic] Issuing new VC for {user_did}...")
-    USER_VCS[user_did] = {"id": f"urn:uuid:{uuid.uuid4()}", "credentialSubject": {"id": user_did, "claims": {"soc_percent": soc}}}
+async def issue_or_update_vc(user_did: str, soc: int) -> str:
+    _, action = await STATE.issue_or_update_vc(user_did, soc)
     await asyncio.sleep(0.1)
-    print(f"[VC Logic] ✓ VC processed for {user_did}.")
+    log.info("VC processed", extra={"fields": {"user_did": user_did, "vc_action": action}})
+    return action
+
+# --- Negotiation Pipeline Helpers ---
+# VC issuance and intent extraction do not depend on each other, so handle_negotiation
+# runs the VC stage as a task alongside the intent stage and settles it afterwards.
+_BACKGROUND_TASKS = set()
+
+async def run_vc_stage(user_did: str, soc: int) -> str:
+    with NEGOTIATE_STAGE_SECONDS.time(stage="issue_or_update_vc"):
+        return await issue_or_update_vc(user_did, soc)
+
+def detach_task(task: asyncio.Task):
+    """Lets a task finish on its own after its request has returned."""
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Marks failures as retrieved
+
+async def settle_vc_stage(vc_task: asyncio.Task, user_did: str, deadline: Deadline) -> str:
+    """Waits for the VC stage within the remaining budget: 'issued', 'updated', 'pending' or 'failed'."""
+    try:
+        return await asyncio.wait_for(asyncio.shield(vc_task), timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        detach_task(vc_task)
+        log.warning("VC stage still running after the plan was ready", extra={"fields": {"user_did": user_did}})
+        return "pending"
+    except Exception as e:
+        log.warning("VC stage failed; plan kept", extra={"fields": {"user_did": user_did, "error": str(e)}})
+        NEGOTIATE_ERRORS.inc(reason="vc")
+        return "failed"
 
 # --- Core API Endpoints ---
 @app.post("/api/grid/stress", summary="Manually set the grid status to STRESSED")
 async def stress_grid():
-    global GRID_IS_STRESSED; GRID_IS_STRESSED = True
+    await set_grid_stressed(True)
     return {"status": "Grid is now STRESSED"}
 
 @app.post("/api/grid/stabilize", summary="Manually set the grid status to STABLE")
 async def stabilize_grid():
-    global GRID_IS_STRESSED; GRID_IS_STRESSED = False
+    await set_grid_stressed(False)
     return {"status": "Grid is now STABLE"}
 
+@app.post("/api/grid/telemetry", status_code=202, summary="Ingests a batch of grid telemetry samples")
+async def ingest_grid_telemetry(request: Request):
+    """Body: {"ts": [...], "site_load_kw": [...], "frequency_hz": [...], "price_eur_mwh": [...]}.
+    Every field is optional; scalars are single samples and a missing "ts" means now."""
+    body, received_at = await request.body(), time.time()
+    try:
+        stored = GRID_DETECTOR.ingest(json.loads(body), now=received_at)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid telemetry batch: {e}")
+    await STATE.share_telemetry(body.decode("utf-8"), received_at)  # Other workers' detectors need it too
+    return {"accepted": stored}
+
+@app.get("/api/policy", summary="The charging policy rule table in force")
+async def get_policy():
+    return POLICY.stats()
+
+@app.get("/api/grid/signals", summary="Rolling grid telemetry statistics and stress detector state")
+async def get_grid_signals():
+    return {**GRID_DETECTOR.stats(), "applies_flips": STATE.is_leader}
+
 @app.post("/api/negotiate", summary="Handles all incoming user charging requests")
-async def handle_negotiation(request: UserNegotiateRequest):
-    print(f"\n--- New Request Received ---")
-    print(f"User: {request.user_did}")
-    print(f"Text: '{request.text}'")
-
-    start_soc_guess = 50
-    text_lower = request.text.lower()
-    if "dead" in text_lower or "empty" in text_lower:
-        start_soc_guess = 5
-    elif '%' in request.text:
-        try:
-            soc_str = text_lower.split('%')[0].strip().split()[-1]
-            start_soc_guess = int(soc_str)
-        except (ValueError, IndexError): pass
-    print(f"[Context] Initial SoC guess: {start_soc_guess}%")
+async def handle_negotiation(request: UserNegotiateRequest, x_request_deadline_ms: float | None = Header(default=None)):
+    # The budget covers the whole request; a client may only tighten it via X-Request-Deadline-Ms.
+    budget_ms = NEGOTIATE_BUDGET_MS if x_request_deadline_ms is None else min(max(x_request_deadline_ms, 0.0), NEGOTIATE_BUDGET_MS)
+    deadline = Deadline(budget_ms / 1000)
+    log.info("Negotiation received", extra={"fields": {"user_did": request.user_did, "text": request.text}})
+
+    with NEGOTIATE_STAGE_SECONDS.time(stage="soc_guess"):
+        start_soc_guess = guess_start_soc(request.text)
     
     # --- BUG FIX 1: Call the VC functions ---
-    user_vc = USER_VCS.get(request.user_did)
-    if user_vc:
-        await issue_or_update_vc(request.user_did, start_soc_guess)
-    else:
-        await issue_or_update_vc(request.user_did, start_soc_guess)
+    # Started now and settled after the intent stage, so its latency overlaps the model call.
+    vc_task = asyncio.create_task(run_vc_stage(request.user_did, start_soc_guess))
 
     try:
-        global GRID_IS_STRESSED, CHARGE_REQUEST_QUEUE
-        grid_status_text = 'stressed' if GRID_IS_STRESSED else 'stable'
-        recent_examples = [r.model_dump() for r in CHARGE_REQUEST_QUEUE if r.user_did != request.user_did][-2:]
+        memory_lines = RECENT_DECISIONS.lines(exclude_user_did=request.user_did)
         
-        enriched_prompt = f"A user with approximately {start_soc_guess}% battery says: '{request.text}'."
-        print(f"[GenAI] Sending enriched prompt...")
-        genai_json = await get_intent_from_genai(enriched_prompt, grid_status_text, recent_examples)
+        with NEGOTIATE_STAGE_SECONDS.time(stage="resolve_intent"):
+            genai_json = await resolve_intent(request.text, start_soc_guess, memory_lines, deadline)
+        STATE.sync()  # The plan follows the grid status at the moment the intent is known
+        POLICY.apply(genai_json, STATE.grid_stressed, datetime.now())
         
         final_start_soc = genai_json.get("start_soc") if genai_json.get("start_soc") is not None else start_soc_guess
         
@@ -130,99 +582,280 @@ async def handle_negotiation(request: UserNegotiateRequest):
             "original_text": request.text,
             "received_at": time.time(),
             "start_soc": final_start_soc,
-            "is_grid_stressed_at_request": GRID_IS_STRESSED
+            "is_grid_stressed_at_request": STATE.grid_stressed
         })
-        print(f"[GenAI] ✓ Final Validated Plan: {genai_json}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Final plan", extra={"fields": {"plan": genai_json}})
+    except AdmissionRejected as e:
+        detach_task(vc_task)  # The credential is still valid for the driver's retry
+        log.warning("Request shed by GenAI admission control", extra={"fields": {"user_did": request.user_did, "reason": e.reason, "retry_after": e.retry_after}})
+        NEGOTIATE_ERRORS.inc(reason="shed")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
-        print(f"[ERROR] GenAI call failed in handle_negotiation: {e}")
+        detach_task(vc_task)
+        log.error("Intent stage failed", extra={"fields": {"user_did": request.user_did, "error": str(e)}})
+        NEGOTIATE_ERRORS.inc(reason="intent")
         raise HTTPException(status_code=500, detail=f"GenAI call failed: {e}")
+
+    # Partial failure is explicit: a plan without a fresh VC is still queued, and reported as such.
+    vc_status = await settle_vc_stage(vc_task, request.user_did, deadline)
     
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post("http://127.0.0.1:8080/api/charge_request", json=genai_json)
-        print(f"[Orchestrator] ✓ Request sent to internal queue.")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to forward request: {e}")
+        # The plan is validated once here and handed straight to the queue service,
+        # instead of looping back over HTTP to /api/charge_request.
+        with NEGOTIATE_STAGE_SECONDS.time(stage="enqueue"):
+            await enqueue_charge_request(InternalChargeRequest(**genai_json))
+            genai_json["pickup_time"] = estimate_pickup_time(request.user_did) or genai_json["pickup_time"]
+        log.info("Request queued", extra={"fields": {"user_did": request.user_did, "priority": genai_json.get("priority"),
+                                                     "charging_option": genai_json.get("charging_option"), "start_soc_guess": start_soc_guess}})
+    except ValidationError as e:
+        NEGOTIATE_ERRORS.inc(reason="enqueue")
+        raise HTTPException(status_code=500, detail=f"Failed to enqueue request: {e}")
         
-    return {"status": "request_received_and_processing", "intent": genai_json}
+    return {"status": "request_received_and_processing", "intent": genai_json, "vc_status": vc_status}
 
 @app.post("/api/charge_request", summary="Adds a request to the internal charging queue")
 async def add_charge_request(request: InternalChargeRequest):
-    global CHARGE_REQUEST_QUEUE
-    CHARGE_REQUEST_QUEUE = [r for r in CHARGE_REQUEST_QUEUE if r.user_did != request.user_did]
-    CHARGE_REQUEST_QUEUE.append(request)
+    await enqueue_charge_request(request)
     return {"status": "request_added_to_queue"}
 
+@app.delete("/api/charge_request/{user_did}", summary="Removes a request from the internal charging queue")
+async def delete_charge_request(user_did: str):
+    if await remove_charge_request(user_did) is None:
+        raise HTTPException(status_code=404, detail=f"No queued request for {user_did}")
+    return {"status": "request_removed_from_queue"}
+
 @app.get("/api/status", summary="Provides the current status of the charging queue and grid")
-async def get_status():
-    global GRID_IS_STRESSED, CHARGE_REQUEST_QUEUE
-    priority_map = {"high": 3, "medium": 2, "low": 1}
-    sorted_queue = sorted(CHARGE_REQUEST_QUEUE, key=lambda r: priority_map.get(r.priority, 0), reverse=True)
-    return {"charger_count": 4, "chargers_in_use": len(sorted_queue), "is_grid_stressed": GRID_IS_STRESSED, "priority_queue": [r.model_dump() for r in sorted_queue]}
+async def get_status(request: Request):
+    STATE.sync()  # One PRAGMA when no other worker has written
+    etag, body = build_status_snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/metrics", summary="Prometheus metrics: stage latency histograms, counters and queue/grid gauges")
+async def get_metrics():
+    return Response(content=METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/intent/stats", summary="Reports intent-stage cache statistics")
+async def get_intent_stats():
+    requests_seen = INTENT_STATS["requests"]
+    return {
+        **INTENT_STATS,
+        "fast_path_share": round(INTENT_STATS["fast_path"] / requests_seen, 4) if requests_seen else 0.0,
+        "fast_path_min_confidence": FAST_PATH_MIN_CONFIDENCE,
+        "intent_cache": INTENT_CACHE.stats(),
+        "batching": INTENT_BATCHER.stats,
+        "admission": GENAI_ADMISSION.stats(),
+        "prompt_static_chars": {"single": SINGLE_INTENT_PROMPT.static_chars, "batch": BATCH_INTENT_PROMPT.static_chars},
+        "negotiate_budget_ms": NEGOTIATE_BUDGET_MS,
+        "hedge_after_seconds": GENAI_LATENCY.percentile(GENAI_HEDGE_PERCENTILE) if GENAI_HEDGE_PERCENTILE > 0 else None,
+    }
+
+@app.get("/api/vc/stats", summary="Reports VC store size, evictions and approximate memory use")
+async def get_vc_stats():
+    return USER_VCS.stats()
+
+@app.get("/api/storage/stats", summary="Reports state backend and SQLite persistence statistics")
+async def get_storage_stats():
+    return STATE.stats()
+
+@app.get("/api/schedule", summary="Charger assignments and time slots for every queued request")
+async def get_schedule():
+    STATE.sync()
+    now = time.time()
+    elapsed = (now - SCHEDULER.epoch) / 60
+    plan = SCHEDULER.plan()
+    assignments = [{
+        "user_did": user_did,
+        "charger_id": slot.charger_id,
+        "start_in_minutes": round(max(slot.start_minutes - elapsed, 0.0), 1),
+        "end_in_minutes": round(max(slot.end_minutes - elapsed, 0.0), 1),
+        "meets_deadline": SCHEDULER.epoch + slot.end_minutes * 60 <= SCHEDULER.deadline_of(user_did),
+    } for user_did, slot in plan]
+    return {
+        "planned_at": now,
+        "chargers": [{"charger_id": c.charger_id, "power_kw": c.power_kw} for c in SCHEDULER.chargers],
+        "chargers_in_use": sum(1 for _, slot in plan if slot.start_minutes <= elapsed < slot.end_minutes),
+        "assignments": assignments,
+        "stats": SCHEDULER.stats(),
+    }
+
+@app.get("/api/power", summary="Current site power cap and per-session kW allocation")
+async def get_power():
+    return {
+        **POWER.stats(),
+        "site_cap_kw": SITE_POWER_CAP_KW,
+        "grid_stressed_factor": GRID_STRESSED_POWER_FACTOR,
+        "sessions": [{"user_did": user_did, "kw": round(kw, 2), "energy_remaining_kwh": round(energy, 2)}
+                     for user_did, kw, energy in POWER.allocations()],
+    }
+
+@app.get("/api/status/stream", summary="Pushes a status snapshot followed by queue and grid deltas (SSE)")
+async def stream_status():
+    STATE.sync()
+    subscriber = STATUS_BROADCASTER.subscribe()
+
+    async def events():
+        try:
+            yield format_sse("snapshot", build_status_snapshot()[1])
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield format_sse("snapshot", build_status_snapshot()[1]) if frame is RESYNC else frame
+        finally:
+            STATUS_BROADCASTER.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- Gemini API Helper Function ---
-async def get_intent_from_genai(user_text: str, grid_status: str, recent_requests: list) -> dict:
-    now = datetime.now()
-    current_time_str = now.strftime("%H:%M")
-
-    # --- Final, Bulletproof Prompt Design ---
-    # Instead of complex examples, we integrate the "learning" as a simple memory.
-    memory_context = ""
-    if recent_requests:
-        memory_context += "\n**Short-Term Memory (What just happened):**\n"
-        for req in recent_requests:
-            memory_context += f"- A user with '{req['priority']}' priority got '{req['charging_option']}' and {req['points_awarded']} points.\n"
-    
-    system_prompt = f"""You are a hyper-efficient EV Charging Bot. Your only goal is to parse user text and output a perfect JSON charging plan.
+FALLBACK_REASONING = "Fallback due to error."
+BUDGET_EXHAUSTED_REASONING = "Latency budget exhausted; rule-based plan."
 
-**Current Time**: {current_time_str}
-**Grid Status**: {grid_status.upper()}
+async def resolve_intent(text: str, start_soc_guess: int, memory_lines: list, deadline: Deadline) -> dict:
+    """Returns the intent (SoCs, deadline, priority) of a request; the charging plan is added by POLICY.
 
-{memory_context}
+    Unambiguous requests are answered by the rule-based fast path, repeated contexts
+    from INTENT_CACHE; only the rest go to Gemini. If Gemini cannot answer within the
+    request's latency budget, the rule-based intent is used regardless of its confidence.
+    """
+    now = datetime.now()
+    INTENT_STATS["requests"] += 1
+    fast_intent = extract_fast_intent(text, now)
+    if fast_intent.confidence >= FAST_PATH_MIN_CONFIDENCE:
+        log.info("Intent resolved", extra={"fields": {"source": "fast_path", "confidence": fast_intent.confidence}})
+        INTENT_STATS["fast_path"] += 1
+        return fast_intent.intent
 
-**Core Rules:**
-1.  **Parse SoCs**: Find `start_soc` ('at 5%', 'dead'=5) and `min_soc` ('need 80%'). If not found, use `null`.
-2.  **Parse Leave By**: Find `leave_by` time (e.g., 'flight to catch' = +2 hours from current time). If none, use `null`.
-3.  **Determine Priority**: `high` (urgent), `medium` (deadline), `low` (flexible).
-4.  **Choose Plan (Grid Logic)**:
-    *   If grid is **STABLE**: Always `fast_charge` (10 pts).
-    *   If grid is **STRESSED**: `high` priority -> `fast_charge` (0 pts); `medium`/`low` -> `eco_charge` (100 pts).
-5.  **Calculate Pickup Time**: Start from **{current_time_str}**. `fast_charge` adds 45 mins. `eco_charge` adds 3 hours. Calculate the final `HH:MM` time.
-6.  **Reasoning**: Briefly explain your decision.
+    cache_key = INTENT_CACHE.make_key(text, start_soc_guess, now)
+    cached_intent = INTENT_CACHE.get(cache_key)
+    if cached_intent is not None:
+        log.info("Intent resolved", extra={"fields": {"source": "cache"}})
+        INTENT_STATS["cache"] += 1
+        return cached_intent
 
-**Output Format**: For the request below, return a single, valid JSON object. All keys are required.
-"""
-    
-    final_prompt = f"{system_prompt}\n**New Request**: {user_text}"
+    enriched_prompt = f"A user with approximately {start_soc_guess}% battery says: '{text}'."
+    log.debug("Sending enriched prompt", extra={"fields": {"prompt": enriched_prompt}})
+    try:
+        async with GENAI_ADMISSION.slot(timeout=deadline.remaining()):
+            plan = await asyncio.wait_for(
+                hedged_intent_from_genai(enriched_prompt, memory_lines),
+                timeout=deadline.remaining(),
+            )
+    except (asyncio.TimeoutError, AdmissionRejected) as e:
+        if isinstance(e, AdmissionRejected) and deadline.remaining() > 0.05:
+            raise  # Shed for overload, not because this request ran out of time
+        log.warning("Latency budget exhausted; using rule-based plan", extra={"fields": {"budget_seconds": deadline.budget_seconds}})
+        INTENT_STATS["budget_exhausted"] += 1
+        return {**fast_intent.intent, "reasoning": BUDGET_EXHAUSTED_REASONING}
+    INTENT_STATS["genai"] += 1
+    if plan.get("reasoning") == FALLBACK_REASONING:
+        INTENT_STATS["fallbacks"] += 1
+    else:
+        INTENT_CACHE.put(cache_key, plan)
+    return plan
 
+async def get_intent_from_genai(user_text: str, memory_lines: list) -> dict:
+    final_prompt = build_intent_prompt(datetime.now(), memory_lines, user_text)
+    GENAI_PROMPT_CHARS.observe(len(final_prompt), call="single")
+
+    started = time.perf_counter()
     try:
         response = await genai_client.aio.models.generate_content(
-            model="gemini-2.5-flash",
+            model=GENAI_MODEL,
             contents=final_prompt,
-            config=GenerateContentConfig(
-                temperature=0.0,
-                response_mime_type="application/json",
-                response_schema=Schema(
-                    type=Type.OBJECT,
-                    properties={
-                        'start_soc': Schema(type=Type.INTEGER, nullable=True),
-                        'priority': Schema(type=Type.STRING),
-                        'leave_by': Schema(type=Type.STRING, nullable=True),
-                        'min_soc': Schema(type=Type.INTEGER, nullable=True),
-                        'charging_option': Schema(type=Type.STRING),
-                        'points_awarded': Schema(type=Type.INTEGER),
-                        'pickup_time': Schema(type=Type.STRING),
-                        'reasoning': Schema(type=Type.STRING, nullable=True),
-                    },
-                    required=["start_soc", "priority", "leave_by", "min_soc", "charging_option", "points_awarded", "pickup_time"]
-                )
-            ),
+            config=SINGLE_INTENT_CONFIG,
         )
-        return json.loads(response.text)
+        plan = json.loads(response.text)
+        GENAI_CALL_SECONDS.observe(time.perf_counter() - started, call="single", outcome="ok")
+        return plan
     except Exception as e:
-        print(f"[GenAI] ✗ ERROR during GenAI call: {e}. Using fallback.")
-        pickup_fallback = (now + timedelta(minutes=45)).strftime("%H:%M")
-        return {"priority": "medium", "leave_by": "18:00", "min_soc": 80, "charging_option": "fast_charge", "points_awarded": 10, "pickup_time": pickup_fallback, "reasoning": "Fallback due to error."}
+        GENAI_CALL_SECONDS.observe(time.perf_counter() - started, call="single", outcome="error")
+        log.error("GenAI call failed; using fallback plan", extra={"fields": {"error": str(e)}})
+        return {"priority": "medium", "leave_by": "18:00", "min_soc": 80, "reasoning": FALLBACK_REASONING}
+
+async def get_intents_from_genai_batch(user_texts: list, memory_lines: list) -> list:
+    """Resolves several requests with one call. Returns plans aligned with `user_texts` (None where missing).
+
+    Raises on transport or parse errors; IntentBatcher then retries the items one by one.
+    """
+    final_prompt = build_batch_prompt(datetime.now(), memory_lines, user_texts)
+    GENAI_PROMPT_CHARS.observe(len(final_prompt), call="batch")
+
+    started = time.perf_counter()
+    try:
+        response = await genai_client.aio.models.generate_content(
+            model=GENAI_MODEL,
+            contents=final_prompt,
+            config=BATCH_INTENT_CONFIG,
+        )
+        batch = json.loads(response.text)
+    except Exception:
+        GENAI_CALL_SECONDS.observe(time.perf_counter() - started, call="batch", outcome="error")
+        raise
+    GENAI_CALL_SECONDS.observe(time.perf_counter() - started, call="batch", outcome="ok")
+    plans = [None] * len(user_texts)
+    for plan in batch:
+        index = plan.pop("index", None) if isinstance(plan, dict) else None
+        if isinstance(index, int) and 0 <= index < len(plans) and plans[index] is None:
+            plans[index] = plan
+    return plans
+
+async def _genai_batch_call(_key, items: list) -> list:
+    # The requests of one batch share a prompt. Each item's memory leaves out its own user, so only the lines
+    # every item has (in the newest item's order) keep all of the batch's users out of the shared memory.
+    memory_lines = [line for line in items[-1][1] if all(line in lines for _, lines in items[:-1])]
+    return await get_intents_from_genai_batch([text for text, _ in items], memory_lines)
+
+async def _genai_single_call(_key, item: tuple) -> dict:
+    text, memory_lines = item
+    return await get_intent_from_genai(text, memory_lines)
+
+INTENT_BATCHER = IntentBatcher(
+    call_batch=_genai_batch_call,
+    call_single=_genai_single_call,
+    window_seconds=GENAI_BATCH_WINDOW_MS / 1000,
+    max_batch_size=GENAI_BATCH_MAX_SIZE,
+    required_keys=tuple(INTENT_REQUIRED_KEYS),
+)
+
+async def hedged_intent_from_genai(user_text: str, memory_lines: list) -> dict:
+    """Goes through the batching stage; if that is slower than the recent p-th percentile, also asks Gemini directly."""
+    async def primary():
+        started = time.perf_counter()
+        plan = await request_intent_from_genai(user_text, memory_lines)
+        if plan.get("reasoning") != FALLBACK_REASONING:
+            GENAI_LATENCY.record(time.perf_counter() - started)
+        return plan
+
+    async def hedge():
+        # A hedge is a second provider call, so it takes a slot of its own; it never queues for one.
+        if not GENAI_ADMISSION.try_acquire():
+            INTENT_STATS["hedges_skipped"] += 1
+            raise AdmissionRejected("no_slot_for_hedge", GENAI_ADMISSION.retry_after())
+        INTENT_STATS["hedged"] += 1
+        try:
+            return await get_intent_from_genai(user_text, memory_lines)
+        finally:
+            GENAI_ADMISSION.release()
+
+    hedge_after = GENAI_LATENCY.percentile(GENAI_HEDGE_PERCENTILE) if GENAI_HEDGE_PERCENTILE > 0 else None
+    if hedge_after is not None:
+        hedge_after = max(hedge_after, GENAI_HEDGE_MIN_DELAY_MS / 1000)
+
+    # A fallback plan means the call failed: keep waiting for the other attempt instead of returning it.
+    return await hedged(primary, hedge, hedge_after, is_failure=lambda plan: plan.get("reasoning") == FALLBACK_REASONING)
+
+async def request_intent_from_genai(user_text: str, memory_lines: list) -> dict:
+    """Sends a prompt through the micro-batching stage, or straight to Gemini when batching is off."""
+    if GENAI_BATCH_WINDOW_MS <= 0 or GENAI_BATCH_MAX_SIZE <= 1:
+        return await get_intent_from_genai(user_text, memory_lines)
+    # The prompt no longer depends on the grid status, so every request can share a batch.
+    return await INTENT_BATCHER.submit(None, (user_text, memory_lines))
 
 
 # --- Main Execution Guard ---
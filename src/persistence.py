@@ -0,0 +1,167 @@
+"""Optional SQLite (WAL) persistence for the queue, the VC store and the grid flag.
+
+The in-memory structures stay authoritative for reads; this module only
+mirrors writes to disk and rebuilds them on startup.
+
+* Writes are handed to a background thread, so the event loop never waits
+  for the disk. The thread drains everything that queued up while its last
+  commit was running (up to `batch_size` operations) and applies it in one
+  transaction, which gives group commits under load without adding delay
+  when idle.
+* WAL mode with `synchronous=NORMAL` (the default here) survives process
+  crashes without an fsync per commit. Use `synchronous="FULL"` to survive
+  power loss too.
+* Requests are acknowledged before their commit: a crash can lose at most
+  the operations still in the writer queue (`stats()["pending"]`).
+* On open, SQLite replays the WAL. `load_state()` then returns the queue in
+  arrival order (rowid order, since upserts use INSERT OR REPLACE), the
+  unexpired credentials and the stored settings.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charge_requests (user_did TEXT PRIMARY KEY, payload TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS credentials (
+    user_did TEXT PRIMARY KEY, credential_id BLOB NOT NULL, soc_percent INTEGER,
+    issued_at REAL NOT NULL, expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_UPSERT_REQUEST = "INSERT OR REPLACE INTO charge_requests (user_did, payload) VALUES (?, ?)"
+_DELETE_REQUEST = "DELETE FROM charge_requests WHERE user_did = ?"
+_PUT_CREDENTIAL = "INSERT OR REPLACE INTO credentials VALUES (?, ?, ?, ?, ?)"
+_SET_SETTING = "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)"
+
+_STOP = object()
+
+
+def connect(path: str, synchronous: str = "NORMAL") -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout=5000")  # Other processes may share the file (see state_backend.py)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def load_state(path: str, now: float | None = None) -> tuple[list, list, dict]:
+    """Returns (queued request dicts in arrival order, unexpired credential rows in issue order, settings)."""
+    now = time.time() if now is None else now
+    conn = connect(path)
+    try:
+        conn.execute("DELETE FROM credentials WHERE expires_at <= ?", (now,))
+        payloads = [row[0] for row in conn.execute("SELECT payload FROM charge_requests ORDER BY rowid")]
+        credentials = conn.execute("SELECT * FROM credentials ORDER BY issued_at").fetchall()
+        settings = dict(conn.execute("SELECT key, value FROM settings"))
+    finally:
+        conn.close()
+    # One decode of a joined array is about twice as fast as a json.loads() per row.
+    return json.loads("[" + ",".join(payloads) + "]"), credentials, settings
+
+
+class DurableStore:
+    def __init__(self, path: str, batch_size: int = 512, synchronous: str = "NORMAL"):
+        self.path = path
+        self.batch_size = batch_size
+        self.synchronous = synchronous
+        self._ops = queue.SimpleQueue()
+        self.submitted = 0  # Only touched by callers; the writer only touches the counters below
+        self.writes = 0
+        self.commits = 0
+        self.max_batch = 0
+        self.write_errors = 0
+        connect(path, synchronous).close()  # Creates the schema before anyone reads
+        self._thread = threading.Thread(target=self._writer, name="durable-store-writer", daemon=True)
+        self._thread.start()
+
+    # --- Write side (called from the event loop; never blocks) ---
+    def upsert_request(self, user_did: str, payload_json: str):
+        self._submit((_UPSERT_REQUEST, (user_did, payload_json)))
+
+    def remove_request(self, user_did: str):
+        self._submit((_DELETE_REQUEST, (user_did,)))
+
+    def put_credential(self, record):
+        self._submit((_PUT_CREDENTIAL, (record.user_did, record.credential_id, record.soc_percent,
+                                        record.issued_at, record.expires_at)))
+
+    def set_setting(self, key: str, value: str):
+        self._submit((_SET_SETTING, (key, value)))
+
+    def _submit(self, op):
+        self.submitted += 1
+        self._ops.put(op)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until everything submitted so far is committed. Not for the event loop."""
+        done = threading.Event()
+        self._ops.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        self._ops.put(_STOP)
+        self._thread.join(timeout)
+
+    # --- Writer thread ---
+    def _writer(self):
+        conn = connect(self.path, self.synchronous)
+        stopping = False
+        while not stopping:
+            batch, waiters = [], []
+            item = self._ops.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._ops.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        try:
+            conn.execute("BEGIN")
+            for sql, params in batch:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+            self.writes += len(batch)
+            self.commits += 1
+            self.max_batch = max(self.max_batch, len(batch))
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.write_errors += len(batch)
+            log.error("Durable store commit failed", extra={"fields": {"ops": len(batch), "error": str(e)}})
+
+    def load(self, now: float | None = None) -> tuple[list, list, dict]:
+        return load_state(self.path, now)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "synchronous": self.synchronous,
+            "pending": self.submitted - self.writes - self.write_errors,
+            "writes": self.writes,
+            "commits": self.commits,
+            "writes_per_commit": round(self.writes / self.commits, 2) if self.commits else 0.0,
+            "max_batch": self.max_batch,
+            "write_errors": self.write_errors,
+        }
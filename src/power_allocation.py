@@ -0,0 +1,272 @@
+"""Grid-capped power allocation across charging sessions.
+
+Every timestep the site power cap (which may change from one step to the
+next, e.g. when the grid is stressed) is shared out among the sessions that
+are on a charger. Each session gets a weight, and the allocation is a
+weighted water-fill: every session receives `level * weight` kW, capped at
+what its charger can deliver, with `level` chosen so the total meets the site
+cap. The weight is the product of three factors:
+
+* priority (high > medium > low),
+* urgency, which grows as the deadline slack shrinks. Slack is the time to
+  `leave_by` minus the time needed at full charger power.
+* SoC gap, the share of the battery still to fill.
+
+Sessions live in flat NumPy arrays (struct of arrays) with O(1) add and
+remove. A step is a handful of vectorized passes plus one sort over the
+sessions on a charger, with no per-session Python code.
+
+Which sessions are on a charger follows the scheduler's plan (`set_plan`):
+each charger serves the earliest-planned of its sessions that still needs
+energy. A session that finishes releases its charger to the next one in line
+within the same step, and `completed` counts those releases so the caller
+can re-plan.
+
+With a `ChargeTimeModel`, a session never gets more than its vehicle accepts
+at its current SoC (the taper). The same arrays also give every session's
+estimated pickup time in one vectorized pass (`pickup_changes`).
+"""
+import numpy as np
+
+PRIORITY_WEIGHTS = {"high": 4.0, "medium": 2.0, "low": 1.0}
+URGENCY_SCALE_HOURS = 0.25  # Slack at which urgency has fallen to half its peak
+
+
+def water_fill(cap_kw: float, max_kw: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """kW per session: min(max_kw, level * weights), with `level` set so the total is at most cap_kw."""
+    active = (weights > 0) & (max_kw > 0)
+    allocation = np.zeros_like(max_kw)
+    if not active.any() or cap_kw <= 0:
+        return allocation
+    caps, w = max_kw[active], weights[active]
+    if caps.sum() <= cap_kw:
+        allocation[active] = caps
+        return allocation
+    order = np.argsort(caps / w)  # Level at which each session saturates, ascending
+    caps_sorted, w_sorted = caps[order], w[order]
+    saturated_kw = np.concatenate(([0.0], np.cumsum(caps_sorted)))   # with the first k saturated
+    unsaturated_w = w_sorted.sum() - np.concatenate(([0.0], np.cumsum(w_sorted)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        levels = (cap_kw - saturated_kw[:-1]) / unsaturated_w[:-1]
+    # The first k for which the level does not saturate session k is the answer.
+    k = int(np.argmax(levels <= (caps_sorted / w_sorted)))
+    allocation[active] = np.minimum(caps, levels[k] * w)
+    return allocation
+
+
+class PowerAllocator:
+    def __init__(self, battery_kwh: float = 60.0, capacity: int = 1024, charge_model=None):
+        self.battery_kwh = battery_kwh
+        self.charge_model = charge_model
+        self._index = {}  # user_did -> row
+        self._users = []  # row -> user_did
+        self.priority_weight = np.zeros(capacity)
+        self.deadline = np.full(capacity, np.inf)  # epoch seconds
+        self.energy_kwh = np.zeros(capacity)       # still to deliver
+        self.max_kw = np.zeros(capacity)           # 0 while not on a charger
+        self.allocation_kw = np.zeros(capacity)
+        self.target_soc = np.zeros(capacity)
+        self.start_minutes = np.full(capacity, np.inf)  # planned wait for a charger; 0 while on one
+        self.planned_kw = np.zeros(capacity)           # power of the planned charger
+        self.charger = np.full(capacity, -1)           # planned charger (index into _chargers), -1 for none
+        self.pickup_minute = np.full(capacity, np.nan)  # last reported pickup estimate (epoch minute)
+        self.planned_at = 0.0  # when start_minutes were planned
+        self._chargers = {}    # charger_id -> index
+        self._follows_plan = False
+        self._reassign = False  # The sessions on chargers must be re-picked before the next allocation
+        self.cap_kw = 0.0
+        self.steps = 0
+        self.completed = 0  # Sessions that finished while on a charger
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    # --- Sessions (O(1); rows are kept dense by moving the last row into a freed one) ---
+    def upsert(self, user_did: str, priority: str, deadline: float, energy_kwh: float, target_soc: float = 80.0):
+        row = self._index.get(user_did)
+        if row is None:
+            row = len(self._users)
+            if row == len(self.energy_kwh):
+                self._grow()
+            self._index[user_did] = row
+            self._users.append(user_did)
+            self.max_kw[row] = 0.0
+            self.allocation_kw[row] = 0.0
+            self.start_minutes[row] = np.inf
+            self.planned_kw[row] = 0.0
+            self.charger[row] = -1
+        self.priority_weight[row] = PRIORITY_WEIGHTS.get(priority, 1.0)
+        self.deadline[row] = deadline
+        self.energy_kwh[row] = energy_kwh
+        self.target_soc[row] = target_soc
+        self.pickup_minute[row] = np.nan
+
+    def remove(self, user_did: str) -> bool:
+        row = self._index.pop(user_did, None)
+        if row is None:
+            return False
+        if self.max_kw[row] > 0 and self._follows_plan:
+            self._reassign = True  # Its charger is free now
+        last = len(self._users) - 1
+        if row != last:
+            moved = self._users[last]
+            self._users[row] = moved
+            self._index[moved] = row
+            for array in self._arrays():
+                array[row] = array[last]
+        self._users.pop()
+        return True
+
+    def clear(self):
+        self._index.clear()
+        self._users.clear()
+
+    def set_plan(self, plan, planned_at: float):
+        """Takes the charger plan as (user_did, start_minutes, charger kW, charger_id), minutes counted from `planned_at`.
+
+        The sessions on chargers are picked from it on the next `step`; a session
+        may start before its planned time if its charger frees up early.
+        """
+        n = len(self._users)
+        self.planned_at = planned_at
+        self.start_minutes[:n] = np.inf
+        self.planned_kw[:n] = 0.0
+        self.charger[:n] = -1
+        for user_did, start_minutes, power_kw, charger_id in plan:
+            row = self._index.get(user_did)
+            if row is not None:
+                self.start_minutes[row] = start_minutes
+                self.planned_kw[row] = power_kw
+                self.charger[row] = self._chargers.setdefault(charger_id, len(self._chargers))
+        self._follows_plan = self._reassign = True
+
+    def _assign_chargers(self):
+        """Puts on each charger the earliest-planned of its sessions that still needs energy."""
+        n = len(self._users)
+        start, charger = self.start_minutes[:n], self.charger[:n]
+        rows = np.flatnonzero((charger >= 0) & (self.energy_kwh[:n] > 0))
+        rows = rows[np.lexsort((start[rows], charger[rows]))]
+        first = rows[np.concatenate(([True], charger[rows][1:] != charger[rows][:-1]))] if len(rows) else rows
+        self.max_kw[:n] = 0.0
+        self.max_kw[first] = self.planned_kw[first]
+        self._reassign = False
+
+    def set_charging(self, charger_kw: dict):
+        """Marks which sessions are on a charger ({user_did: charger kW}) instead of following a plan."""
+        self._follows_plan = self._reassign = False
+        self.max_kw[:len(self._users)] = 0.0
+        for user_did, power_kw in charger_kw.items():
+            row = self._index.get(user_did)
+            if row is not None:
+                self.max_kw[row] = power_kw
+
+    _FILLS = (("priority_weight", 0.0), ("deadline", np.inf), ("energy_kwh", 0.0), ("max_kw", 0.0),
+              ("allocation_kw", 0.0), ("target_soc", 0.0), ("start_minutes", np.inf), ("planned_kw", 0.0),
+              ("charger", -1), ("pickup_minute", np.nan))
+
+    def _arrays(self):
+        return [getattr(self, name) for name, _ in self._FILLS]
+
+    def _grow(self):
+        size = len(self.energy_kwh) * 2
+        for name, fill in self._FILLS:
+            old = getattr(self, name)
+            new = np.full(size, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # --- Timestep ---
+    def soc(self, rows=None) -> np.ndarray:
+        """Current SoC (%) of each session (or of `rows` only), from the energy still to deliver."""
+        rows = slice(0, len(self._users)) if rows is None else rows
+        return self.target_soc[rows] - self.energy_kwh[rows] / self.battery_kwh * 100
+
+    def weights(self, now: float, rows: np.ndarray | None = None) -> np.ndarray:
+        """Allocation weight of each session (or of `rows` only)."""
+        rows = slice(0, len(self._users)) if rows is None else rows
+        max_kw, energy = self.max_kw[rows], self.energy_kwh[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hours_needed = np.where(max_kw > 0, energy / max_kw, np.inf)
+        slack_hours = np.maximum((self.deadline[rows] - now) / 3600 - hours_needed, 0.0)
+        urgency = 1.0 + URGENCY_SCALE_HOURS / (slack_hours + URGENCY_SCALE_HOURS)  # 2 at zero slack, -> 1 with no deadline
+        soc_gap = np.minimum(energy / self.battery_kwh, 1.0)
+        return self.priority_weight[rows] * urgency * soc_gap
+
+    def step(self, cap_kw: float, now: float, dt_seconds: float = 0.0) -> np.ndarray:
+        """Allocates `cap_kw` for this step and, if `dt_seconds` is given, delivers the energy of the previous one."""
+        n = len(self._users)
+        efficiency = self.charge_model.efficiency if self.charge_model else 1.0
+        if dt_seconds > 0:
+            delivered = self.allocation_kw[:n] * (dt_seconds / 3600) * efficiency
+            finishing = (delivered > 0) & (self.energy_kwh[:n] <= delivered)
+            np.maximum(self.energy_kwh[:n] - delivered, 0.0, out=self.energy_kwh[:n])
+            finished = int(np.count_nonzero(finishing))
+            if finished:
+                self.completed += finished
+                self._reassign = self._follows_plan  # Hand their chargers on within this step
+        if self._reassign:
+            self._assign_chargers()
+        # Only sessions on a charger take part; the rest of the queue costs one mask pass.
+        rows = np.flatnonzero(self.max_kw[:n])
+        limit = self.max_kw[rows]
+        if self.charge_model:  # The vehicle's taper at its current SoC
+            limit = np.minimum(limit, self.charge_model.max_power_kw(self.soc(rows)))
+        if dt_seconds > 0:  # Never more than a session needs to finish within this step
+            limit = np.minimum(limit, self.energy_kwh[rows] / (dt_seconds / 3600 * efficiency))
+        self.allocation_kw[:n] = 0.0
+        self.allocation_kw[rows] = water_fill(cap_kw, limit, self.weights(now, rows))
+        self.cap_kw = cap_kw
+        self.steps += 1
+        return self.allocation_kw[:n]
+
+    def finish_minutes(self, now: float, cap_share: float = 1.0) -> np.ndarray:
+        """Minutes from now until each session reaches its target SoC (needs a charge model).
+
+        Sessions on a charger charge at their current allocation. The others
+        wait for their planned slot, then charge at their charger's power
+        scaled by `cap_share` (site cap / total charger power, at most 1).
+        Sessions without a planned slot get inf.
+        """
+        n = len(self._users)
+        charging = self.max_kw[:n] > 0
+        power = np.where(charging, self.allocation_kw[:n], self.planned_kw[:n] * min(cap_share, 1.0))
+        wait = np.where(charging, 0.0, np.maximum(self.start_minutes[:n] - (now - self.planned_at) / 60, 0.0))
+        return wait + self.charge_model.minutes(self.soc(), self.target_soc[:n], power, self.battery_kwh)
+
+    def pickup_changes(self, now: float, cap_share: float = 1.0) -> list[tuple[str, float]]:
+        """(user_did, pickup epoch seconds) for sessions whose estimate moved to another minute since last reported."""
+        n = len(self._users)
+        if not n:
+            return []
+        minutes = self.finish_minutes(now, cap_share)
+        pickup_minute = np.where(np.isfinite(minutes), np.ceil(now / 60 + minutes), np.nan)
+        # A finished session keeps the estimate it was last given.
+        done = (self.energy_kwh[:n] <= 0) & np.isfinite(self.pickup_minute[:n])
+        rows = np.flatnonzero(np.isfinite(pickup_minute) & (pickup_minute != self.pickup_minute[:n]) & ~done)
+        self.pickup_minute[rows] = pickup_minute[rows]
+        return [(self._users[row], float(pickup_minute[row]) * 60) for row in rows]
+
+    def reset_pickups(self):
+        """Forgets the reported estimates, so the next `pickup_changes` reports every session."""
+        self.pickup_minute[:len(self._users)] = np.nan
+
+    def remaining_kwh(self) -> dict:
+        """{user_did: kWh still to deliver} for every session."""
+        return dict(zip(self._users, self.energy_kwh[:len(self._users)].tolist()))
+
+    def allocations(self) -> list[tuple[str, float, float]]:
+        """(user_did, kW, kWh still to deliver) for every session currently drawing power."""
+        n = len(self._users)
+        rows = np.flatnonzero(self.allocation_kw[:n] > 0)
+        return [(self._users[row], float(self.allocation_kw[row]), float(self.energy_kwh[row])) for row in rows]
+
+    def stats(self) -> dict:
+        n = len(self._users)
+        return {
+            "sessions": n,
+            "charging": int(np.count_nonzero(self.max_kw[:n])),
+            "cap_kw": self.cap_kw,
+            "allocated_kw": round(float(self.allocation_kw[:n].sum()), 3),
+            "steps": self.steps,
+            "completed": self.completed,
+        }
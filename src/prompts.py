@@ -0,0 +1,164 @@
+"""Precompiled prompt templates and reusable GenAI request configs.
+
+The system prompt is the same for every request except for a few slots
+(current time, short-term memory, the request text). The model only extracts
+the intent; the charging plan is computed locally (charging_plan.py). The
+templates below are parsed once at import: constant text, including the output
+format of each call type, is merged into literal chunks, and a render only
+drops the per-request slot values into place and joins. The response schema and
+`GenerateContentConfig` objects are likewise built once and shared by all calls.
+Short-term memory lines are rendered once per queued request and kept in a
+small ring buffer (`RecentDecisions`), so assembling the memory never looks
+at the queue.
+"""
+from collections import deque
+from datetime import datetime
+from string import Formatter
+
+from google.genai.types import GenerateContentConfig, Schema, Type
+
+
+class PromptTemplate:
+    """A `str.format`-style template compiled into literal chunks and named slots.
+
+    `fixed` values are baked into the literals at compile time.
+    """
+
+    def __init__(self, text: str, **fixed):
+        pieces, slots = [], []
+        literal = ""
+        for text_part, field, _, _ in Formatter().parse(text):
+            literal += text_part
+            if field is None:
+                continue
+            if field in fixed:
+                literal += str(fixed[field])
+                continue
+            pieces.append(literal)
+            slots.append((len(pieces), field))
+            pieces.append(None)
+            literal = ""
+        pieces.append(literal)
+        self._pieces = pieces
+        self._slots = slots
+        self.slot_names = tuple(dict.fromkeys(name for _, name in slots))
+        self.static_chars = sum(len(p) for p in pieces if p)
+
+    def render(self, **values) -> str:
+        pieces = self._pieces.copy()
+        for index, name in self._slots:
+            pieces[index] = values[name]
+        return "".join(pieces)
+
+
+SINGLE_OUTPUT_FORMAT = "**Output Format**: For the request below, return a single, valid JSON object. All keys are required."
+BATCH_OUTPUT_FORMAT = ("**Output Format**: For EACH numbered request below, return one JSON object in a JSON array. "
+                       "Set `index` to the request's number. All keys are required.")
+
+# --- Final, Bulletproof Prompt Design ---
+# Instead of complex examples, we integrate the "learning" as a simple memory.
+SYSTEM_PROMPT = """You are a hyper-efficient EV Charging Bot. Your only goal is to parse user text and output the driver's charging intent as perfect JSON.
+
+**Current Time**: {current_time}
+
+{memory_context}
+
+**Core Rules:**
+1.  **Parse SoCs**: Find `start_soc` ('at 5%', 'dead'=5) and `min_soc` ('need 80%'). If not found, use `null`.
+2.  **Parse Leave By**: Find `leave_by` time (e.g., 'flight to catch' = +2 hours from current time). If none, use `null`.
+3.  **Determine Priority**: `high` (urgent), `medium` (deadline), `low` (flexible).
+4.  **Reasoning**: Briefly explain your decision.
+
+{output_format}
+"""
+
+SINGLE_INTENT_PROMPT = PromptTemplate(SYSTEM_PROMPT + "\n**New Request**: {request}", output_format=SINGLE_OUTPUT_FORMAT)
+BATCH_INTENT_PROMPT = PromptTemplate(SYSTEM_PROMPT + "\n**New Requests**:\n{requests}", output_format=BATCH_OUTPUT_FORMAT)
+
+MEMORY_HEADER = "\n**Short-Term Memory (What just happened):**\n"
+
+
+def render_memory_line(request: dict) -> str:
+    """One short-term memory line for a queued request (rendered once, when it is queued)."""
+    return f"- A user was given '{request['priority']}' priority (min_soc {request.get('min_soc')}, leave_by {request.get('leave_by')}).\n"
+
+
+def render_memory_context(memory_lines: list) -> str:
+    if not memory_lines:
+        return ""
+    return MEMORY_HEADER + "".join(memory_lines)
+
+
+class RecentDecisions:
+    """The last few queued decisions as pre-rendered memory lines, at most one per user (newest last).
+
+    Recording and reading touch only the `size + 1` buffered lines, never the queue.
+    """
+
+    def __init__(self, size: int = 2):
+        self.size = size
+        self._entries = deque(maxlen=size + 1)  # One spare, so leaving out the asking user still leaves `size`
+
+    def record(self, request: dict):
+        self.discard(request["user_did"])
+        self._entries.append((request["user_did"], render_memory_line(request)))
+
+    def discard(self, user_did: str) -> bool:
+        """Forgets a user's line (their request left the queue). Returns True if one was buffered."""
+        for entry in self._entries:
+            if entry[0] == user_did:
+                self._entries.remove(entry)
+                return True
+        return False
+
+    def clear(self):
+        self._entries.clear()
+
+    def lines(self, exclude_user_did: str | None = None) -> list[str]:
+        lines = [line for user_did, line in self._entries if user_did != exclude_user_did]
+        return lines[len(lines) - self.size:] if len(lines) > self.size else lines
+
+
+def build_intent_prompt(now: datetime, memory_lines: list, user_text: str) -> str:
+    return SINGLE_INTENT_PROMPT.render(
+        current_time=now.strftime("%H:%M"),
+        memory_context=render_memory_context(memory_lines),
+        request=user_text,
+    )
+
+
+def build_batch_prompt(now: datetime, memory_lines: list, user_texts: list) -> str:
+    return BATCH_INTENT_PROMPT.render(
+        current_time=now.strftime("%H:%M"),
+        memory_context=render_memory_context(memory_lines),
+        requests="\n".join(f"[{i}] {text}" for i, text in enumerate(user_texts)),
+    )
+
+
+# --- Response schema & configs (built once, shared by every call) ---
+INTENT_SCHEMA_PROPERTIES = {
+    'start_soc': Schema(type=Type.INTEGER, nullable=True),
+    'priority': Schema(type=Type.STRING, enum=["high", "medium", "low"]),
+    'leave_by': Schema(type=Type.STRING, nullable=True),
+    'min_soc': Schema(type=Type.INTEGER, nullable=True),
+    'reasoning': Schema(type=Type.STRING, nullable=True),
+}
+INTENT_REQUIRED_KEYS = ["start_soc", "priority", "leave_by", "min_soc"]
+
+SINGLE_INTENT_CONFIG = GenerateContentConfig(
+    temperature=0.0,
+    response_mime_type="application/json",
+    response_schema=Schema(type=Type.OBJECT, properties=INTENT_SCHEMA_PROPERTIES, required=INTENT_REQUIRED_KEYS),
+)
+BATCH_INTENT_CONFIG = GenerateContentConfig(
+    temperature=0.0,
+    response_mime_type="application/json",
+    response_schema=Schema(
+        type=Type.ARRAY,
+        items=Schema(
+            type=Type.OBJECT,
+            properties={'index': Schema(type=Type.INTEGER), **INTENT_SCHEMA_PROPERTIES},
+            required=["index", *INTENT_REQUIRED_KEYS],
+        ),
+    ),
+)
@@ -0,0 +1,193 @@
+"""Charger-assignment scheduler: which vehicle charges where, and when.
+
+Queued sessions are ordered by priority (high first), then earliest deadline
+(`leave_by`), then arrival. Each one, in that order, goes to the charger where
+it would finish first. With one heap of free times per charger power class,
+that is O(log C) per session even with hundreds of chargers. Times are
+minutes from the plan's `epoch`; every charger is free at 0.
+
+`advance(now, energy_kwh)` moves the epoch forward with the energy each
+session still needs. Sessions that have finished (0 kWh) then take no charger
+time, so their chargers go to the next sessions in line.
+
+Rescheduling is incremental. A change at position p of the order cannot
+affect the slots of sessions before p, so the plan keeps a snapshot of the
+charger heaps every `checkpoint_every` positions and, on the next read,
+replays only from the last snapshot before the earliest change. A
+low-priority arrival at the back of a long queue therefore touches a handful
+of sessions rather than all of them. Changes between two reads are
+coalesced.
+"""
+import bisect
+import heapq
+import math
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from charge_queue import priority_rank
+
+DEFAULT_BATTERY_KWH = 60.0
+DEFAULT_START_SOC = 50
+DEFAULT_MIN_SOC = 80
+
+
+class Charger(NamedTuple):
+    charger_id: str
+    power_kw: float
+
+
+class Slot(NamedTuple):
+    charger_id: str
+    start_minutes: float
+    end_minutes: float
+
+
+def parse_topology(spec: str) -> list[Charger]:
+    """'4x22,2x150' -> four 22 kW and two 150 kW chargers (IDs C1..C6)."""
+    chargers = []
+    for group in filter(None, (part.strip() for part in spec.split(","))):
+        count, _, power_kw = group.partition("x")
+        for _ in range(int(count)):
+            chargers.append(Charger(f"C{len(chargers) + 1}", float(power_kw)))
+    if not chargers:
+        raise ValueError(f"Charger topology {spec!r} defines no chargers")
+    return chargers
+
+
+def deadline_for(leave_by: str | None, received_at: float) -> float:
+    """Epoch seconds of the first `leave_by` (HH:MM) after the request arrived; inf if none/unparseable."""
+    if not leave_by:
+        return math.inf
+    try:
+        clock = datetime.strptime(leave_by, "%H:%M")
+    except ValueError:
+        return math.inf
+    arrived = datetime.fromtimestamp(received_at)
+    deadline = arrived.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if deadline <= arrived:
+        deadline += timedelta(days=1)
+    return deadline.timestamp()
+
+
+def energy_needed_kwh(start_soc: int | None, min_soc: int | None, battery_kwh: float = DEFAULT_BATTERY_KWH) -> float:
+    start = DEFAULT_START_SOC if start_soc is None else start_soc
+    target = DEFAULT_MIN_SOC if min_soc is None else min_soc
+    return max(target - start, 0) / 100 * battery_kwh
+
+
+class ChargerScheduler:
+    def __init__(self, chargers: list[Charger], checkpoint_every: int = 64):
+        self.chargers = chargers
+        self.checkpoint_every = checkpoint_every
+        self._classes = sorted({c.power_kw for c in chargers}, reverse=True)
+        self._initial = {kw: [(0.0, c.charger_id) for c in chargers if c.power_kw == kw] for kw in self._classes}
+        self._order = []      # sort keys, in schedule order
+        self._sessions = {}   # user_did -> (sort key, energy_kwh, deadline)
+        self._slots = []      # Slot per position of _order (valid before _dirty_from)
+        self._checkpoints = [self._initial]  # [i]: charger heaps before position i * checkpoint_every
+        self._dirty_from = 0
+        self.epoch = time.time()  # Slot times are minutes from here
+        self.version = 0  # Bumped on every change to the plan
+        self.replayed_sessions = 0
+        self.replays = 0
+
+    # --- Changes (O(log n) search + list shift; scheduling work is deferred to the next read) ---
+    def upsert(self, user_did: str, priority: str, leave_by: str | None, received_at: float,
+               energy_kwh: float):
+        self.remove(user_did)
+        deadline = deadline_for(leave_by, received_at)
+        key = (-priority_rank(priority), deadline, received_at, user_did)
+        position = bisect.bisect_left(self._order, key)
+        self._order.insert(position, key)
+        self._sessions[user_did] = (key, energy_kwh, deadline)
+        self._invalidate(position)
+
+    def upsert_request(self, request: dict, battery_kwh: float = DEFAULT_BATTERY_KWH):
+        """Takes a queued request as a dict (e.g. InternalChargeRequest.model_dump())."""
+        self.upsert(request["user_did"], request["priority"], request.get("leave_by"), request["received_at"],
+                    energy_needed_kwh(request.get("start_soc"), request.get("min_soc"), battery_kwh))
+
+    def remove(self, user_did: str) -> bool:
+        session = self._sessions.pop(user_did, None)
+        if session is None:
+            return False
+        position = bisect.bisect_left(self._order, session[0])
+        del self._order[position]
+        self._invalidate(position)
+        return True
+
+    def clear(self):
+        self._order.clear()
+        self._sessions.clear()
+        self._invalidate(0)
+
+    def advance(self, now: float, energy_kwh: dict):
+        """Re-plans every session from `now` with the energy it still needs ({user_did: kWh}; others keep theirs)."""
+        for user_did, (key, energy, deadline) in self._sessions.items():
+            self._sessions[user_did] = (key, energy_kwh.get(user_did, energy), deadline)
+        self.epoch = now
+        self._invalidate(0)
+
+    def _invalidate(self, position: int):
+        self.version += 1
+        self._dirty_from = min(self._dirty_from, position)
+        del self._slots[self._dirty_from:]
+        del self._checkpoints[self._dirty_from // self.checkpoint_every + 1:]
+
+    # --- Reads ---
+    def _replay(self):
+        """Recomputes slots from the last checkpoint at or before the first changed position."""
+        if len(self._slots) == len(self._order):
+            return
+        every = self.checkpoint_every
+        start = (len(self._checkpoints) - 1) * every
+        heaps = {kw: list(heap) for kw, heap in self._checkpoints[-1].items()}
+        del self._slots[start:]
+
+        for position in range(start, len(self._order)):
+            if position % every == 0 and position > start:
+                self._checkpoints.append({kw: list(heap) for kw, heap in heaps.items()})
+            key = self._order[position]
+            energy_kwh = self._sessions[key[3]][1]
+            best = None
+            for kw in self._classes:
+                free_at, _ = heaps[kw][0]
+                end = free_at + energy_kwh / kw * 60
+                if best is None or end < best[1]:
+                    best = (kw, end)
+            kw, end = best
+            free_at, charger_id = heapq.heappop(heaps[kw])
+            heapq.heappush(heaps[kw], (end, charger_id))
+            self._slots.append(Slot(charger_id, free_at, end))
+
+        self.replays += 1
+        self.replayed_sessions += len(self._order) - start
+        self._dirty_from = len(self._order)
+
+    def plan(self) -> list[tuple[str, Slot]]:
+        """(user_did, slot) for every session, in schedule order."""
+        self._replay()
+        return [(key[3], slot) for key, slot in zip(self._order, self._slots)]
+
+    def slot_for(self, user_did: str) -> Slot | None:
+        session = self._sessions.get(user_did)
+        if session is None:
+            return None
+        self._replay()
+        return self._slots[bisect.bisect_left(self._order, session[0])]
+
+    def deadline_of(self, user_did: str) -> float:
+        return self._sessions[user_did][2]
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._order),
+            "chargers": len(self.chargers),
+            "power_classes_kw": self._classes,
+            "replays": self.replays,
+            "replayed_sessions": self.replayed_sessions,
+        }
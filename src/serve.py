@@ -0,0 +1,35 @@
+"""Production entry point: runs the orchestrator in N uvicorn worker processes.
+
+Workers share the queue, the VC store and the grid flag through the SQLite
+state backend (`STATE_BACKEND=sqlite`, see state_backend.py), so a request
+can land on any worker. One worker keeps the default in-memory backend.
+
+    python3 serve.py --workers 4 --db charge_state.db
+
+Caches, admission control and GenAI batching stay per worker: set
+GENAI_MAX_IN_FLIGHT to the per-worker share of the upstream quota. Grid
+telemetry is shared, and one worker (the leader) applies the grid flips
+derived from it.
+"""
+import argparse
+import os
+
+import uvicorn
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Charge Consensus orchestrator with several worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', 8080)))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--db", default=os.environ.get('CHARGE_DB_PATH', "charge_state.db"),
+                        help="SQLite file shared by the workers")
+    parser.add_argument("--log-level", default="warning", help="uvicorn's own log level (app logs use LOG_LEVEL)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Read by every worker when it imports orchestrator.py.
+        os.environ['STATE_BACKEND'] = "sqlite"
+        os.environ['CHARGE_DB_PATH'] = os.path.abspath(args.db)
+    print(f"Starting Charge Consensus AI Orchestrator with {args.workers} worker(s) on http://{args.host}:{args.port}")
+    uvicorn.run("orchestrator:app", host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level, access_log=False)
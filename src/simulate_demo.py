@@ -9,20 +9,20 @@ USERS = [
     {"user_did": "did:denso:user:maria:789", "text": "My car is at 15%. I just need a full charge by tomorrow morning, please."}
 ]
 
-async def send_request(user: dict):
+async def send_request(client: httpx.AsyncClient, user: dict):
     driver_name = user['user_did'].split(':')[-2]
     print(f">>> Simulating request for: {driver_name.upper()}")
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(f"{ORCHESTRATOR_URL}/api/negotiate", json=user)
-            response.raise_for_status()
+        response = await client.post(f"{ORCHESTRATOR_URL}/api/negotiate", json=user)
+        response.raise_for_status()
     except Exception as e:
         print(f"✗ ERROR for {driver_name}: {e}")
 
 async def main():
     print("--- Running 'ALL USERS' Simulation ---")
-    tasks = [send_request(user) for user in USERS]
-    await asyncio.gather(*tasks)
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        tasks = [send_request(client, user) for user in USERS]
+        await asyncio.gather(*tasks)
     print("--- All initial users have been sent to the orchestrator. ---")
 
 if __name__ == "__main__":
@@ -0,0 +1,430 @@
+"""Pluggable state backends: where the queue, the VC store and the grid flag live.
+
+The orchestrator only talks to a `StateBackend`. Every backend keeps local
+views (a `ChargeQueue`, a `CredentialStore` and `grid_stressed`) that request
+handlers read without I/O. Each change to those views, whether made locally
+or picked up from another process, is reported once through
+`on_change(event, data)` with the event being "upsert", "remove", "grid",
+"pickup" or "resync". "telemetry" hands over grid telemetry that another
+worker received.
+
+One worker at a time is the leader (`is_leader`) and runs the jobs that must
+happen once per deployment, such as deriving the grid state from telemetry
+and estimating pickup times.
+A single process always leads; shared workers hold a lease that the others
+take over once it expires.
+
+* `MemoryBackend` keeps state in this process. It can mirror it to SQLite
+  (`persistence.DurableStore`) and restore it on startup. It is one process only.
+* `SQLiteSharedBackend` lets several worker processes on one host share state
+  through one SQLite (WAL) file. Each write commits together with a row in an
+  append-only `changes` log. Commits run on a writer thread with its own
+  connection, so a worker waiting for another one's write lock never stalls
+  its event loop; the write returns once committed. Workers replay the log
+  incrementally in `sync()`, which costs a single `PRAGMA data_version` when
+  nothing has changed. A worker that has fallen behind the pruned log rebuilds
+  its views from scratch.
+
+Writes are coroutines; reads of the local views never do I/O.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from credential_store import CredentialRecord
+from persistence import connect
+
+log = logging.getLogger(__name__)
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, user_did TEXT, payload TEXT
+);
+CREATE TABLE IF NOT EXISTS telemetry (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT NOT NULL, received_at REAL NOT NULL, payload TEXT NOT NULL
+);
+"""
+
+
+class StateBackend(ABC):
+    def __init__(self, queue, credentials, request_factory, on_change=None):
+        """`request_factory(**fields)` rebuilds a queued request from its JSON fields."""
+        self.queue = queue
+        self.credentials = credentials
+        self.request_factory = request_factory
+        self.on_change = on_change or (lambda event, data: None)
+        self.grid_stressed = False
+        self.grid_changed_at = None  # Epoch seconds of the last flip, shared so every worker re-plans alike
+        self.epoch = uuid.uuid4().hex[:8]
+        self.is_leader = True
+
+    # --- Lifecycle ---
+    def load(self):
+        """Fills the local views from storage. Called once before serving."""
+
+    def sync(self) -> bool:
+        """Applies changes made by other processes. Returns True if anything changed."""
+        return False
+
+    def close(self):
+        pass
+
+    def status_token(self) -> str:
+        """Changes whenever the queue or the grid flag does; the same token means the same /api/status payload."""
+        return f"{self.epoch}-{self.queue.version}-{int(self.grid_stressed)}"
+
+    # --- Writes ---
+    @abstractmethod
+    async def upsert_request(self, request):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove_request(self, user_did: str):
+        """Returns the removed request, or None if the user was not queued."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_grid_stressed(self, stressed: bool) -> bool:
+        """Returns True if the flag actually changed."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def issue_or_update_vc(self, user_did: str, soc_percent: int) -> tuple[CredentialRecord, str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_pickup_times(self, pickup_times: dict):
+        """Stores estimated {user_did: "HH:MM"} pickup times on the queued requests."""
+        raise NotImplementedError
+
+    async def share_telemetry(self, payload_json: str, received_at: float):
+        """Passes a telemetry batch this worker has ingested on to the other workers."""
+
+    async def renew_leadership(self, lease_seconds: float) -> bool:
+        """Takes or extends the leader lease; returns `is_leader`."""
+        return self.is_leader
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "queued": len(self.queue), "credentials": self.credentials.stats()}
+
+    # --- Local view updates (the only place on_change fires) ---
+    def _apply_upsert(self, request):
+        self.queue.upsert(request)
+        self.on_change("upsert", request.model_dump())
+
+    def _apply_remove(self, user_did: str):
+        removed = self.queue.remove(user_did)
+        if removed is not None:
+            self.on_change("remove", {"user_did": user_did})
+        return removed
+
+    def _apply_grid(self, stressed: bool, changed_at: float) -> bool:
+        if self.grid_stressed == stressed:
+            return False
+        self.grid_stressed = stressed
+        self.grid_changed_at = changed_at
+        self.on_change("grid", {"is_grid_stressed": stressed, "changed_at": changed_at})
+        return True
+
+    def _apply_pickups(self, pickup_times: dict):
+        applied = {}
+        for user_did, pickup_time in pickup_times.items():
+            request = self.queue.get(user_did)
+            if request is not None:  # Plain __dict__ write, as in charging_plan.replan_queue
+                applied[user_did] = vars(request)["pickup_time"] = pickup_time
+        if applied:
+            self.queue.touch()
+            self.on_change("pickup", {"pickup_times": applied})
+
+
+class MemoryBackend(StateBackend):
+    """Single-process state, optionally mirrored to a `DurableStore`."""
+
+    def __init__(self, queue, credentials, request_factory, on_change=None, durable=None):
+        super().__init__(queue, credentials, request_factory, on_change)
+        self.durable = durable
+
+    def load(self):
+        if not self.durable:
+            return
+        requests, credentials, settings = self.durable.load()
+        for fields in requests:
+            self.queue.upsert(self.request_factory(**fields))
+        for row in credentials:
+            self.credentials.restore(*row)
+        self.grid_stressed = json.loads(settings.get("grid_is_stressed", "false"))
+        self.grid_changed_at = json.loads(settings.get("grid_changed_at", "null"))
+
+    def close(self):
+        if self.durable:
+            self.durable.close()
+
+    async def upsert_request(self, request):
+        self._apply_upsert(request)
+        if self.durable:
+            self.durable.upsert_request(request.user_did, request.model_dump_json())
+
+    async def remove_request(self, user_did: str):
+        removed = self._apply_remove(user_did)
+        if removed is not None and self.durable:
+            self.durable.remove_request(user_did)
+        return removed
+
+    async def set_grid_stressed(self, stressed: bool) -> bool:
+        changed = self._apply_grid(stressed, time.time())
+        if changed and self.durable:
+            self.durable.set_setting("grid_is_stressed", json.dumps(stressed))
+            self.durable.set_setting("grid_changed_at", json.dumps(self.grid_changed_at))
+        return changed
+
+    async def set_pickup_times(self, pickup_times: dict):
+        self._apply_pickups(pickup_times)  # Not mirrored: estimates are remade on the first power step after a restart
+
+    async def issue_or_update_vc(self, user_did: str, soc_percent: int) -> tuple[CredentialRecord, str]:
+        record, action = self.credentials.issue_or_update(user_did, soc_percent)
+        if self.durable:
+            self.durable.put_credential(record)
+        return record, action
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["durable"] = self.durable.stats() if self.durable else None
+        return stats
+
+
+class SQLiteSharedBackend(StateBackend):
+    """State shared by worker processes through one SQLite file plus a change log."""
+
+    def __init__(self, queue, credentials, request_factory, path: str, on_change=None,
+                 synchronous: str = "NORMAL", change_log_keep: int = 100_000, maintenance_every: int = 1000,
+                 read_busy_timeout_ms: int = 20):
+        super().__init__(queue, credentials, request_factory, on_change)
+        self.path = path
+        self.change_log_keep = change_log_keep
+        self.maintenance_every = maintenance_every
+        # After startup, only the writer thread uses this connection; it may wait out other workers' write locks.
+        self._write_conn = connect(path, synchronous)
+        self._write_conn.executescript(SHARED_SCHEMA)
+        self._write_conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-writer")
+        # Reads run on the event loop. In WAL mode they do not wait for writers, so a busy read is rare
+        # and is retried on the next sync() rather than waited out.
+        self._conn = connect(path, synchronous)
+        self._conn.execute(f"PRAGMA busy_timeout={int(read_busy_timeout_ms)}")
+        self.epoch = self._conn.execute("SELECT value FROM settings WHERE key = 'epoch'").fetchone()[0]
+        self.worker = uuid.uuid4().hex[:8]
+        self.is_leader = False
+        self._last_seq = 0
+        self._telemetry_seq = 0
+        self._data_version = None
+        self._writes = 0
+        self.applied_changes = 0
+        self.full_reloads = 0
+        self.busy_syncs = 0
+        self.telemetry_batches = 0  # Received from other workers
+
+    def status_token(self) -> str:
+        # The change sequence is global, so every worker hands out the same ETag for the same state.
+        return f"{self.epoch}-{self._last_seq}"
+
+    # --- Reading the shared state ---
+    def load(self):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            telemetry_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM telemetry").fetchone()[0]
+            payloads = [row[0] for row in conn.execute("SELECT payload FROM charge_requests ORDER BY rowid")]
+            grid = dict(conn.execute("SELECT key, value FROM settings WHERE key IN ('grid_is_stressed', 'grid_changed_at')"))
+        finally:
+            conn.execute("COMMIT")
+        self.queue.clear()
+        for fields in json.loads("[" + ",".join(payloads) + "]"):
+            self.queue.upsert(self.request_factory(**fields))
+        self.grid_stressed = json.loads(grid.get("grid_is_stressed", "false"))
+        self.grid_changed_at = json.loads(grid.get("grid_changed_at", "null"))
+        self._last_seq = last_seq
+        self._telemetry_seq = max(self._telemetry_seq, telemetry_seq)
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def sync(self) -> bool:
+        try:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            changed = self._pull_changes()
+            self._pull_telemetry()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            self.busy_syncs += 1  # Picked up by the next sync()
+            return False
+        self._data_version = data_version
+        return changed
+
+    def _pull_changes(self) -> bool:
+        rows = self._conn.execute("SELECT seq, kind, user_did, payload FROM changes WHERE seq > ? ORDER BY seq",
+                                  (self._last_seq,)).fetchall()
+        if not rows:
+            return False
+        if rows[0][0] > self._last_seq + 1:  # The changes we still needed were pruned
+            self.full_reloads += 1
+            self.load()
+            self.on_change("resync", None)
+            return True
+        for seq, kind, user_did, payload in rows:
+            if kind == "upsert":
+                self._apply_upsert(self.request_factory(**json.loads(payload)))
+            elif kind == "remove":
+                self._apply_remove(user_did)
+            elif kind == "grid":
+                self._apply_grid(**json.loads(payload))
+            elif kind == "pickup":
+                self._apply_pickups(json.loads(payload))
+            self._last_seq = seq
+        self.applied_changes += len(rows)
+        return True
+
+    def _pull_telemetry(self):
+        rows = self._conn.execute("SELECT seq, received_at, payload FROM telemetry WHERE seq > ? AND worker != ? ORDER BY seq",
+                                  (self._telemetry_seq, self.worker)).fetchall()
+        for seq, received_at, payload in rows:
+            self._telemetry_seq = seq
+            self.on_change("telemetry", {"columns": json.loads(payload), "received_at": received_at})
+        self.telemetry_batches += len(rows)
+
+    # --- Writes (committed on the writer thread, then applied through the change log) ---
+    async def _write(self, statements: list):
+        await self._in_transaction(_execute_all, statements)
+
+    async def _in_transaction(self, work, *args):
+        """Runs `work(conn, *args)` in one write transaction on the writer thread; returns its result once committed."""
+        result = await asyncio.get_running_loop().run_in_executor(self._writer, self._transaction, work, args)
+        self.sync()  # Our own commit moved data_version too
+        return result
+
+    def _transaction(self, work, args: tuple):
+        conn = self._write_conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.maintenance_every == 0:
+            self._writer.submit(self._maintenance)  # Runs after this write, still off the event loop
+        return result
+
+    async def upsert_request(self, request):
+        payload = request.model_dump_json()
+        await self._write([
+            ("INSERT OR REPLACE INTO charge_requests (user_did, payload) VALUES (?, ?)", (request.user_did, payload)),
+            ("INSERT INTO changes (kind, user_did, payload) VALUES ('upsert', ?, ?)", (request.user_did, payload)),
+        ])
+
+    async def remove_request(self, user_did: str):
+        self.sync()
+        removed = self.queue.get(user_did)
+        if removed is None:
+            return None
+        await self._write([
+            ("DELETE FROM charge_requests WHERE user_did = ?", (user_did,)),
+            ("INSERT INTO changes (kind, user_did) VALUES ('remove', ?)", (user_did,)),
+        ])
+        return removed
+
+    async def set_grid_stressed(self, stressed: bool) -> bool:
+        self.sync()
+        if self.grid_stressed == stressed:
+            return False
+        changed_at = time.time()
+        await self._write([
+            ("INSERT OR REPLACE INTO settings (key, value) VALUES ('grid_is_stressed', ?)", (json.dumps(stressed),)),
+            ("INSERT OR REPLACE INTO settings (key, value) VALUES ('grid_changed_at', ?)", (json.dumps(changed_at),)),
+            ("INSERT INTO changes (kind, payload) VALUES ('grid', ?)",
+             (json.dumps({"stressed": stressed, "changed_at": changed_at}),)),
+        ])
+        return True
+
+    async def set_pickup_times(self, pickup_times: dict):
+        await self._write([
+            *(("UPDATE charge_requests SET payload = json_set(payload, '$.pickup_time', ?) WHERE user_did = ?",
+               (pickup_time, user_did)) for user_did, pickup_time in pickup_times.items()),
+            ("INSERT INTO changes (kind, payload) VALUES ('pickup', ?)", (json.dumps(pickup_times),)),
+        ])
+
+    async def issue_or_update_vc(self, user_did: str, soc_percent: int) -> tuple[CredentialRecord, str]:
+        """Issues against the shared credentials table; the local store keeps this worker's recent ones."""
+        now = time.time()
+        record, _ = self.credentials.issue_or_update(user_did, soc_percent, now)
+        existing = await self._in_transaction(_put_credential, record)
+        return record, "updated" if existing and existing[0] > now else "issued"
+
+    async def share_telemetry(self, payload_json: str, received_at: float):
+        await self._write([("INSERT INTO telemetry (worker, received_at, payload) VALUES (?, ?, ?)",
+                            (self.worker, received_at, payload_json))])
+
+    async def renew_leadership(self, lease_seconds: float) -> bool:
+        self.is_leader = await self._in_transaction(_claim_leadership, self.worker, lease_seconds)
+        return self.is_leader
+
+    def _maintenance(self):
+        """Prunes the change and telemetry logs and drops expired or excess credentials (on the writer thread)."""
+        try:
+            self._transaction(_prune, (self.change_log_keep, self.credentials.max_size))
+        except sqlite3.Error as e:
+            log.warning("Shared state maintenance failed", extra={"fields": {"path": self.path, "error": str(e)}})
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._write_conn.close()
+        self._conn.close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(path=self.path, worker=self.worker, is_leader=self.is_leader, last_seq=self._last_seq,
+                     applied_changes=self.applied_changes, full_reloads=self.full_reloads, busy_syncs=self.busy_syncs,
+                     telemetry_batches=self.telemetry_batches)
+        return stats
+
+
+# --- Write transactions (run on the writer thread) ---
+def _execute_all(conn: sqlite3.Connection, statements: list):
+    for sql, params in statements:
+        conn.execute(sql, params)
+
+
+def _put_credential(conn: sqlite3.Connection, record: CredentialRecord):
+    """Stores `record` and returns the previous row's (expires_at,), or None."""
+    existing = conn.execute("SELECT expires_at FROM credentials WHERE user_did = ?", (record.user_did,)).fetchone()
+    conn.execute("INSERT OR REPLACE INTO credentials VALUES (?, ?, ?, ?, ?)",
+                 (record.user_did, record.credential_id, record.soc_percent, record.issued_at, record.expires_at))
+    return existing
+
+
+def _claim_leadership(conn: sqlite3.Connection, worker: str, lease_seconds: float) -> bool:
+    """Takes the lease if it is free, expired or already ours."""
+    now = time.time()
+    row = conn.execute("SELECT value FROM settings WHERE key = 'leader'").fetchone()
+    holder = json.loads(row[0]) if row else None
+    if holder and holder["worker"] != worker and holder["expires_at"] > now:
+        return False
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('leader', ?)",
+                 (json.dumps({"worker": worker, "expires_at": now + lease_seconds}),))
+    return True
+
+
+def _prune(conn: sqlite3.Connection, change_log_keep: int, max_credentials: int):
+    conn.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (change_log_keep,))
+    conn.execute("DELETE FROM telemetry WHERE seq <= (SELECT MAX(seq) FROM telemetry) - ?", (change_log_keep,))
+    conn.execute("DELETE FROM credentials WHERE expires_at <= ?", (time.time(),))
+    conn.execute("DELETE FROM credentials WHERE user_did IN "
+                 "(SELECT user_did FROM credentials ORDER BY issued_at DESC LIMIT -1 OFFSET ?)", (max_credentials,))
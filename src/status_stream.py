@@ -0,0 +1,61 @@
+"""Fan-out broadcaster for the /api/status/stream Server-Sent Events endpoint.
+
+Every change is encoded into an SSE frame exactly once and the same bytes are
+handed to all subscribers, so the cost of a change does not depend on how many
+dashboards are open. A subscriber that falls behind is not allowed to grow an
+unbounded backlog: its pending frames are dropped and it is told to resync
+from a fresh snapshot instead.
+"""
+import asyncio
+import json
+
+RESYNC = object()  # Sentinel: the subscriber missed frames and needs a full snapshot
+
+
+def format_sse(event: str, data) -> bytes:
+    """Encodes one SSE frame. `data` may be pre-serialized JSON (str/bytes) or a JSON-able object."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    elif not isinstance(data, str):
+        data = json.dumps(data)
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+class StatusBroadcaster:
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self._subscribers: set[asyncio.Queue] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber = asyncio.Queue(maxsize=self.max_pending)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data):
+        """Queues one frame for every subscriber. Never blocks."""
+        if not self._subscribers:
+            return
+        frame = format_sse(event, data)
+        for subscriber in self._subscribers:
+            try:
+                subscriber.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._resync(subscriber)
+
+    def resync_all(self):
+        """Tells every subscriber to reload a full snapshot (e.g. after state was rebuilt)."""
+        for subscriber in self._subscribers:
+            self._resync(subscriber)
+
+    @staticmethod
+    def _resync(subscriber: asyncio.Queue):
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        subscriber.put_nowait(RESYNC)
@@ -0,0 +1,56 @@
+"""Policy tables that must be rejected with ValueError, and a watcher that outlives bad files.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charging_plan import DEFAULT_POLICY, ChargingPolicy, compile_policy
+
+
+def with_rules(*rules) -> dict:
+    table = copy.deepcopy(DEFAULT_POLICY)
+    table["rules"] = [*rules, *table["rules"]]
+    return table
+
+
+MALFORMED = [
+    [],
+    {"rules": []},
+    {"pickup_minutes": {"fast_charge": 45}, "rules": 5},
+    {"pickup_minutes": {"fast_charge": "soon"}, "rules": []},
+    with_rules("oops"),
+    with_rules(None),
+    with_rules({"priority": 5, "charging_option": "fast_charge", "points_awarded": 0}),
+    with_rules({"priority": ["high", 1], "charging_option": "fast_charge", "points_awarded": 0}),
+    with_rules({"grid": "brownout", "charging_option": "fast_charge", "points_awarded": 0}),
+    with_rules({"grid": ["stable"], "charging_option": "fast_charge", "points_awarded": 0}),
+    with_rules({"charging_option": ["fast_charge"], "points_awarded": 0}),
+    with_rules({"charging_option": "fast_charge", "points_awarded": "ten"}),
+    {"pickup_minutes": {"fast_charge": 45}, "rules": [{"grid": "stable", "charging_option": "fast_charge", "points_awarded": 0}]},
+]
+
+
+@pytest.mark.parametrize("table", MALFORMED)
+def test_compile_policy_rejects_malformed_tables(table):
+    with pytest.raises(ValueError):
+        compile_policy(table)
+
+
+def test_reload_counts_any_failure_and_keeps_rules(tmp_path):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(DEFAULT_POLICY))
+    policy = ChargingPolicy(str(path))
+    for i, text in enumerate(['{"rules": ["oops"]', json.dumps(with_rules("oops"))]):
+        path.write_text(text)
+        os.utime(path, ns=(i, i))  # Distinct mtimes even within the filesystem's timestamp resolution
+        with pytest.raises(ValueError):
+            policy.reload()
+    assert (policy.version, policy.reload_errors) == (1, 2)
+    assert policy.plan_for("high", True) == ("fast_charge", 0)
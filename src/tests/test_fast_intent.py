@@ -0,0 +1,56 @@
+"""Table-driven checks for the rule-based intent fast path.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fast_intent import UNPARSED_DEADLINE_MAX_CONFIDENCE, extract_fast_intent
+
+NOW = datetime(2026, 10, 17, 14, 0)
+THRESHOLD = 0.8  # FAST_PATH_MIN_CONFIDENCE's default in orchestrator.py
+
+CASES = [
+    # text, priority, start_soc, min_soc, leave_by, skips the model
+    ("My battery is dead, emergency!", "high", 5, None, None, True),
+    ("I'm at 15%, need 80% asap", "high", 15, 80, None, True),
+    ("At 40%, no rush, I'm here all day", "low", 40, None, None, True),
+    ("I am at 15% and need to leave at 18:30", "medium", 15, None, "18:30", True),
+    ("At 30%, meeting at 5pm", "medium", 30, None, "17:00", True),
+    ("At 30%, need to be gone by 17:00", "medium", 30, None, "17:00", True),
+    ("At 30%, need to be gone by 5pm", "medium", 30, None, "17:00", True),
+    ("At 20%, leave at 9:15 pm", "medium", 20, None, "21:15", True),
+    ("Car at 50%, not in a hurry", "low", 50, None, None, False),
+    ("at 5% not urgent", "low", 5, None, None, False),
+    ("At 60%, I don't need it urgently", "medium", 60, None, None, False),
+    ("At 25%, I have a meeting later", "medium", 25, None, None, False),
+    ("At 25%, leaving at noon-ish", "medium", 25, None, None, False),
+    ("Urgent, but whenever works", "medium", None, None, None, False),
+    ("Maybe charge it?", "medium", None, None, None, False),
+]
+
+
+@pytest.mark.parametrize("text, priority, start_soc, min_soc, leave_by, fast", CASES)
+def test_extract_fast_intent(text, priority, start_soc, min_soc, leave_by, fast):
+    intent, confidence = extract_fast_intent(text, NOW)
+    assert (intent["priority"], intent["start_soc"], intent["min_soc"], intent["leave_by"]) == (
+        priority, start_soc, min_soc, leave_by)
+    assert (confidence >= THRESHOLD) == fast, confidence
+
+
+@pytest.mark.parametrize("text", ["Meeting soon, at 30%", "At 70%, appointment this afternoon", "Leave at half six, 40%"])
+def test_unparsed_deadline_stays_below_threshold(text):
+    intent, confidence = extract_fast_intent(text, NOW)
+    assert intent["leave_by"] is None
+    assert confidence <= UNPARSED_DEADLINE_MAX_CONFIDENCE < THRESHOLD
+
+
+def test_flight_sets_deadline_from_now():
+    intent, confidence = extract_fast_intent("Catching a flight, at 20%", NOW)
+    assert (intent["priority"], intent["leave_by"]) == ("high", "16:00")
+    assert confidence >= THRESHOLD
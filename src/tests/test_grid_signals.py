@@ -0,0 +1,80 @@
+"""Ring buffers and the stress detector's hysteresis and dwell time.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from grid_signals import RingBuffer, StressDetector, Thresholds
+
+THRESHOLDS = {"site_load_kw": Thresholds(enter=70.0, exit=60.0, above=True),
+              "frequency_hz": Thresholds(enter=49.8, exit=49.9, above=False)}
+WINDOW, DWELL = 10.0, 30.0
+
+
+def detector() -> StressDetector:
+    return StressDetector(THRESHOLDS, window_seconds=WINDOW, min_dwell_seconds=DWELL, capacity=64)
+
+
+def feed(detector: StressDetector, now: float, **signals) -> bool | None:
+    """Fills the window with constant readings and evaluates at `now`."""
+    ts = np.arange(now - WINDOW + 1, now + 1)
+    detector.ingest({"ts": ts, **{name: np.full(len(ts), value) for name, value in signals.items()}})
+    return detector.evaluate(now)
+
+
+def test_hysteresis_between_enter_and_exit_thresholds():
+    d = detector()
+    assert feed(d, 100.0, site_load_kw=65.0) is None   # Below enter: stays stable
+    assert feed(d, 200.0, site_load_kw=72.0) is True
+    assert feed(d, 300.0, site_load_kw=65.0) is None   # Above exit: holds stressed
+    assert feed(d, 400.0, site_load_kw=59.0) is False
+    assert feed(d, 500.0, site_load_kw=65.0) is None   # Below enter again: stays stable
+    assert d.transitions == 2
+
+
+def test_low_frequency_enters_and_every_signal_must_clear_to_exit():
+    d = detector()
+    assert feed(d, 100.0, site_load_kw=50.0, frequency_hz=49.75) is True
+    assert d.reasons == ["frequency_hz"]
+    assert feed(d, 200.0, site_load_kw=50.0, frequency_hz=49.85) is None  # Still short of its exit
+    assert feed(d, 300.0, site_load_kw=61.0, frequency_hz=49.95) is None  # Load has not cleared
+    assert feed(d, 400.0, site_load_kw=50.0, frequency_hz=49.95) is False
+
+
+def test_min_dwell_holds_each_state():
+    d = detector()
+    assert feed(d, 100.0, site_load_kw=80.0) is True
+    assert feed(d, 100.0 + DWELL - 1, site_load_kw=40.0) is None
+    assert feed(d, 100.0 + DWELL, site_load_kw=40.0) is False
+    assert feed(d, 100.0 + DWELL + 1, site_load_kw=80.0) is None
+    assert d.stressed is False
+
+
+def test_signals_without_samples_do_not_vote():
+    d = detector()
+    assert feed(d, 100.0, site_load_kw=80.0) is True
+    assert d.evaluate(100.0 + DWELL + WINDOW + 1) is None  # The window has emptied; no evidence to clear
+    assert d.stressed is True
+
+
+def test_ring_buffer_keeps_the_latest_samples():
+    buffer = RingBuffer(4)
+    buffer.extend(np.arange(3.0), np.arange(3.0))
+    buffer.extend(np.arange(3.0, 10.0), np.arange(3.0, 10.0))  # More than the capacity in one batch
+    assert sorted(buffer.since(0.0)) == [6.0, 7.0, 8.0, 9.0]
+    assert sorted(buffer.since(8.0)) == [8.0, 9.0]
+    assert (buffer.latest(), buffer.total) == (9.0, 10)
+
+
+def test_ingest_rejects_mismatched_or_non_finite_batches():
+    d = detector()
+    with pytest.raises(ValueError):
+        d.ingest({"ts": [1.0, 2.0], "site_load_kw": [60.0]})
+    with pytest.raises(ValueError):
+        d.ingest({"site_load_kw": [60.0, float("nan")]})
@@ -0,0 +1,79 @@
+"""Weighted water-fill and the allocator's step, against a plain reference.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from power_allocation import PowerAllocator, water_fill
+
+
+def reference_fill(cap_kw: float, max_kw: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Bisects on the water level instead of sorting by saturation level."""
+    caps = np.where(weights > 0, max_kw, 0.0)
+    if caps.sum() <= cap_kw:
+        return caps
+    low, high = 0.0, float(np.max(caps[weights > 0] / weights[weights > 0]))
+    for _ in range(200):
+        level = (low + high) / 2
+        low, high = (level, high) if np.minimum(caps, level * weights).sum() < cap_kw else (low, level)
+    return np.minimum(caps, high * weights)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_water_fill_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 60))
+    max_kw = rng.choice([0.0, 11.0, 22.0, 50.0, 150.0], size=n) * rng.uniform(0.2, 1.0, size=n)
+    weights = rng.uniform(0, 8, size=n) * (rng.random(n) > 0.1)
+    cap_kw = float(rng.uniform(0, 1.2) * max_kw.sum())
+
+    allocation = water_fill(cap_kw, max_kw, weights)
+    np.testing.assert_allclose(allocation, reference_fill(cap_kw, max_kw, weights), atol=1e-6)
+    assert allocation.sum() == pytest.approx(min(cap_kw, max_kw[weights > 0].sum()))
+    assert np.all(allocation <= max_kw + 1e-9)
+
+
+def test_water_fill_shares_by_weight_until_a_session_saturates():
+    allocation = water_fill(60.0, np.array([50.0, 50.0, 10.0]), np.array([2.0, 1.0, 4.0]))
+    # Level 10: the third session saturates at 10 kW; the other 50 kW split 2:1.
+    np.testing.assert_allclose(allocation, [100 / 3, 50 / 3, 10.0])
+
+
+@pytest.mark.parametrize("cap_kw, max_kw, weights, expected", [
+    (0.0, [22.0, 22.0], [1.0, 1.0], [0.0, 0.0]),
+    (-5.0, [22.0], [1.0], [0.0]),
+    (100.0, [22.0, 50.0], [1.0, 3.0], [22.0, 50.0]),    # Undersubscribed: every session at full power
+    (30.0, [22.0, 50.0, 0.0], [0.0, 1.0, 5.0], [0.0, 30.0, 0.0]),  # No weight, or no charger, gets nothing
+])
+def test_water_fill_edge_cases(cap_kw, max_kw, weights, expected):
+    np.testing.assert_allclose(water_fill(cap_kw, np.array(max_kw), np.array(weights)), expected)
+
+
+def test_step_hands_a_finished_sessions_charger_to_the_next_in_line():
+    allocator = PowerAllocator(battery_kwh=60.0, capacity=2)  # Grows past its initial capacity
+    for user_did, energy_kwh in (("did:a", 0.5), ("did:b", 30.0), ("did:c", 30.0)):
+        allocator.upsert(user_did, "medium", np.inf, energy_kwh)
+    allocator.set_plan([("did:a", 0.0, 50.0, "C1"), ("did:b", 5.0, 50.0, "C1"), ("did:c", 0.0, 22.0, "C2")], 0.0)
+
+    allocator.step(100.0, 0.0)
+    assert dict((user_did, kw) for user_did, kw, _ in allocator.allocations()) == {"did:a": 50.0, "did:c": 22.0}
+
+    allocator.step(100.0, 60.0, 60.0)  # did:a needs 0.5 kWh, less than a minute at 50 kW
+    assert (allocator.completed, allocator.remaining_kwh()["did:a"]) == (1, 0.0)
+    assert dict((user_did, kw) for user_did, kw, _ in allocator.allocations()) == {"did:b": 50.0, "did:c": 22.0}
+
+
+def test_site_cap_favours_higher_priority():
+    allocator = PowerAllocator(battery_kwh=60.0)
+    allocator.upsert("did:high", "high", np.inf, 30.0)
+    allocator.upsert("did:low", "low", np.inf, 30.0)
+    allocator.set_charging({"did:high": 50.0, "did:low": 50.0})
+    high, low = allocator.step(50.0, 0.0)
+    assert high + low == pytest.approx(50.0)
+    assert high == pytest.approx(4 * low)
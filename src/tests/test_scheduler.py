@@ -0,0 +1,89 @@
+"""Incremental replay of the charger scheduler against planning from scratch.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scheduler import ChargerScheduler, parse_topology
+
+CHARGERS = parse_topology("3x22,2x50,1x150")
+CHECKPOINT_EVERY = 4
+PRIORITIES = ["high", "medium", "low"]
+
+
+def make_session(rng: random.Random, i: int) -> tuple:
+    leave_by = rng.choice([None, "08:30", "12:00", "17:45", "23:10"])
+    return (f"did:test:{i}", rng.choice(PRIORITIES), leave_by, 1_790_000_000.0 + i, rng.uniform(0, 60))
+
+
+def from_scratch(sessions: dict) -> list:
+    scheduler = ChargerScheduler(CHARGERS, checkpoint_every=CHECKPOINT_EVERY)
+    for session in sessions.values():
+        scheduler.upsert(*session)
+    return scheduler.plan()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_plan_matches_from_scratch(seed):
+    rng = random.Random(seed)
+    scheduler = ChargerScheduler(CHARGERS, checkpoint_every=CHECKPOINT_EVERY)
+    sessions = {}
+    for i in range(40):
+        session = make_session(rng, i)
+        sessions[session[0]] = session
+        scheduler.upsert(*session)
+    scheduler.plan()  # Fills the checkpoints, so later changes replay from the middle
+    for i in range(40, 200):
+        action = rng.random()
+        if action < 0.45 or not sessions:
+            session = make_session(rng, i)
+        elif action < 0.7:  # Re-request: the same user moves to a new position
+            session = (rng.choice(list(sessions)), *make_session(rng, i)[1:])
+        else:
+            user_did = rng.choice(list(sessions))
+            assert scheduler.remove(user_did)
+            del sessions[user_did]
+            session = None
+        if session is not None:
+            sessions[session[0]] = session
+            scheduler.upsert(*session)
+        if rng.random() < 0.5:  # Sometimes coalesce several changes into one replay
+            assert scheduler.plan() == from_scratch(sessions)
+    assert scheduler.plan() == from_scratch(sessions)
+
+
+def test_change_at_the_back_replays_from_the_last_checkpoint():
+    scheduler = ChargerScheduler(CHARGERS, checkpoint_every=CHECKPOINT_EVERY)
+    for i in range(20):
+        scheduler.upsert(f"did:test:{i}", "high", None, float(i), 10.0)
+    scheduler.plan()
+    replayed = scheduler.replayed_sessions
+    scheduler.upsert("did:test:late", "low", None, 100.0, 10.0)
+    scheduler.plan()
+    assert scheduler.replayed_sessions - replayed <= CHECKPOINT_EVERY + 1
+
+
+def test_remove_of_unknown_user_keeps_the_plan():
+    scheduler = ChargerScheduler(CHARGERS, checkpoint_every=CHECKPOINT_EVERY)
+    scheduler.upsert("did:test:0", "medium", None, 0.0, 10.0)
+    version = scheduler.version
+    assert not scheduler.remove("did:test:missing")
+    assert scheduler.version == version
+
+
+def test_finished_session_frees_its_charger_after_advance():
+    scheduler = ChargerScheduler(parse_topology("1x50"))
+    for i in range(3):
+        scheduler.upsert(f"did:test:{i}", "high", None, float(i), 50.0)  # One hour each
+    assert scheduler.slot_for("did:test:1") == ("C1", 60.0, 120.0)
+
+    scheduler.advance(scheduler.epoch + 600, {"did:test:0": 0.0, "did:test:2": 25.0})
+    assert scheduler.slot_for("did:test:0") == ("C1", 0.0, 0.0)
+    assert scheduler.slot_for("did:test:1") == ("C1", 0.0, 60.0)  # Kept its 50 kWh
+    assert scheduler.slot_for("did:test:2") == ("C1", 60.0, 90.0)
@@ -0,0 +1,66 @@
+"""State backends: the interface contract and two workers sharing one SQLite file.
+
+Run from the repository root:  python3 -m pytest src/tests
+"""
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from charge_queue import ChargeQueue
+from credential_store import CredentialStore
+from state_backend import MemoryBackend, SQLiteSharedBackend, StateBackend
+
+
+class Request(SimpleNamespace):  # The two methods the backends use from InternalChargeRequest
+    def model_dump(self) -> dict:
+        return dict(vars(self))
+
+    def model_dump_json(self) -> str:
+        return json.dumps(vars(self))
+
+
+def make_request(user_did: str) -> Request:
+    return Request(user_did=user_did, priority="medium", received_at=0.0, pickup_time=None)
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class NoPickups(MemoryBackend):
+        set_pickup_times = StateBackend.set_pickup_times
+
+    with pytest.raises(TypeError, match="set_pickup_times"):
+        NoPickups(ChargeQueue(), CredentialStore(), Request)
+    with pytest.raises(TypeError):
+        StateBackend(ChargeQueue(), CredentialStore(), Request)
+
+
+def test_workers_share_queue_grid_and_pickup_times(tmp_path):
+    events = []
+    path = str(tmp_path / "state.db")
+    a = SQLiteSharedBackend(ChargeQueue(), CredentialStore(), Request, path)
+    b = SQLiteSharedBackend(ChargeQueue(), CredentialStore(), Request, path, on_change=lambda e, d: events.append(e))
+    a.load()
+    b.load()
+
+    async def writes():
+        await a.upsert_request(make_request("did:a"))
+        await a.set_grid_stressed(True)
+        await a.set_pickup_times({"did:a": "18:45", "did:gone": "19:00"})
+    asyncio.run(writes())
+
+    assert b.sync()
+    assert events == ["upsert", "grid", "pickup"]
+    assert (b.queue.get("did:a").pickup_time, b.grid_stressed) == ("18:45", True)
+    assert a.status_token() == b.status_token()
+    a.close()
+    b.close()
+
+    restarted = SQLiteSharedBackend(ChargeQueue(), CredentialStore(), Request, path)
+    restarted.load()
+    assert restarted.queue.get("did:a").pickup_time == "18:45"
+    restarted.close()